@@ -0,0 +1,341 @@
+# thoth-lab
+# Copyright(C) 2019 Marek Cermak, Francesco Murdaca
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Local caches for data retrieved from Ceph."""
+
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import typing
+import zlib
+
+from pathlib import Path
+
+logger = logging.getLogger("thoth.lab.cache")
+
+_DEFAULT_CACHE_DIR = "~/.cache/thoth-lab"
+
+
+def _get_cache_dir(cache_dir: typing.Union[str, Path] = None) -> Path:
+    """Get cache directory, `THOTH_LAB_CACHE_DIR` environment variable takes precedence over the default."""
+    cache_dir = cache_dir or os.getenv("THOTH_LAB_CACHE_DIR", _DEFAULT_CACHE_DIR)
+
+    return Path(cache_dir).expanduser()
+
+
+class InspectionDocumentCache(object):
+    """Persistent on-disk cache of inspection documents.
+
+    Inspection documents are immutable once stored in Ceph, therefore they never have to be invalidated.
+    Documents are stored gzip-compressed under a sha256 digest of the inspection id. When the total size
+    of the cache exceeds `max_size` bytes, the least recently used documents are evicted until the size drops
+    below `low_water_mark` fraction of `max_size`, so that the eviction does not run on every subsequent store.
+    """
+
+    def __init__(
+        self, cache_dir: typing.Union[str, Path] = None, max_size: int = 2 * 1024 ** 3, low_water_mark: float = 0.9
+    ):
+        """Initialize cache in the given directory."""
+        self.cache_dir: Path = _get_cache_dir(cache_dir) / "inspections"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.max_size = max_size
+        self.low_water_mark = low_water_mark
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self._iter_files())
+
+    def __contains__(self, inspection_id: str) -> bool:
+        """Check whether the document is present in the cache."""
+        return self._get_path(inspection_id).exists()
+
+    def __len__(self) -> int:
+        """Return number of cached documents."""
+        return sum(1 for _ in self._iter_files())
+
+    @property
+    def size(self) -> int:
+        """Return total size of the cached documents in bytes."""
+        return self._size
+
+    @property
+    def stats(self) -> typing.Dict[str, int]:
+        """Return cache hit/miss counters and current size of the cache."""
+        return {"hits": self.hits, "misses": self.misses, "size": self.size}
+
+    def get(self, inspection_id: str) -> typing.Optional[dict]:
+        """Get document from the cache, return None if the document is not cached."""
+        path = self._get_path(inspection_id)
+
+        try:
+            with gzip.open(path, "rt") as f:
+                document = json.load(f)
+
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+
+            return None
+        except (OSError, EOFError, ValueError, zlib.error) as exc:
+            # truncated or foreign file (gzip.BadGzipFile is an OSError), drop it so that it gets rewritten
+            logger.warning(f"Removing corrupted cached document {path.name}: {exc!s}")
+            self._remove(path)
+
+            with self._lock:
+                self.misses += 1
+
+            return None
+
+        with self._lock:
+            self.hits += 1
+
+        return document
+
+    def put(self, inspection_id: str, document: dict):
+        """Store the document in the cache and evict least recently used documents if necessary."""
+        path = self._get_path(inspection_id)
+        path.parent.mkdir(exist_ok=True)
+
+        # write to a temporary file first so that concurrent readers never see partial documents
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file, gzip.open(tmp_file, "wt") as f:
+                json.dump(document, f)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        size = os.path.getsize(tmp_path)
+        replaced_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += size - replaced_size
+
+        if self._size > self.max_size:
+            self.evict()
+
+    def retrieve(self, inspection_id: str, retrieve_document: typing.Callable[[str], dict]) -> dict:
+        """Get document from the cache, retrieve and cache it using `retrieve_document` on cache miss."""
+        document = self.get(inspection_id)
+
+        if document is None:
+            document = retrieve_document(inspection_id)
+            self.put(inspection_id, document)
+
+        return document
+
+    def evict(self, max_size: int = None):
+        """Evict least recently used documents until the cache fits into `max_size` bytes.
+
+        :param max_size: size of the cache to evict down to, defaults to `low_water_mark` fraction of `max_size`
+        """
+        max_size = int(self.max_size * self.low_water_mark) if max_size is None else max_size
+
+        with self._lock:
+            files = sorted(((path.stat(), path) for path in self._iter_files()), key=lambda f: f[0].st_mtime)
+
+            self._size = sum(stat.st_size for stat, _ in files)
+            for stat, path in files:
+                if self._size <= max_size:
+                    break
+
+                path.unlink()
+                self._size -= stat.st_size
+
+                logger.debug(f"Evicted cached document: {path.name}")
+
+    def clear(self):
+        """Remove all documents from the cache."""
+        self.evict(max_size=0)
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return  # removed concurrently
+
+        with self._lock:
+            self._size -= size
+
+    def _get_path(self, inspection_id: str) -> Path:
+        digest = hashlib.sha256(inspection_id.encode("utf-8")).hexdigest()
+
+        return self.cache_dir / digest[:2] / f"{digest}.json.gz"
+
+    def _iter_files(self) -> typing.Iterator[Path]:
+        return self.cache_dir.glob("*/*.json.gz")
+
+
+class InspectionIdIndex(object):
+    """Index of inspection ids by inspection identifier, optionally persisted locally.
+
+    The index is built once from the listing of the inspection store and refreshed incrementally, only
+    inspection ids that are not indexed yet are added and ids no longer listed are dropped. Each inspection id
+    is recorded together with the time it was first seen by the index, which approximates creation time
+    of the inspection for ids picked up by regular refreshes.
+    """
+
+    def __init__(self, cache_dir: typing.Union[str, Path] = None, persist: bool = True):
+        """Initialize index, load previously persisted index from the cache directory if available."""
+        self.path: typing.Optional[Path] = _get_cache_dir(cache_dir) / "inspection_ids.json" if persist else None
+
+        self._first_seen: typing.Dict[str, float] = {}
+        self._identifiers: typing.Dict[str, typing.List[str]] = {}
+
+        if self.path is not None and self.path.exists():
+            self._first_seen = json.loads(self.path.read_text())
+            for inspection_id in self._first_seen:
+                self._add(inspection_id)
+
+    def __contains__(self, identifier: str) -> bool:
+        """Check whether there are any inspection ids indexed for the given identifier."""
+        return identifier in self._identifiers
+
+    def __getitem__(self, identifier: str) -> typing.List[str]:
+        """Get inspection ids of the given identifier."""
+        return self._identifiers.get(identifier, [])
+
+    def __len__(self) -> int:
+        """Return number of indexed inspection ids."""
+        return len(self._first_seen)
+
+    @property
+    def built_at(self) -> typing.Optional[float]:
+        """Return time the index was built, all inspection ids of the initial listing are first seen at this time."""
+        return min(self._first_seen.values()) if self._first_seen else None
+
+    @property
+    def identifiers(self) -> typing.List[str]:
+        """Return all indexed identifiers."""
+        return list(self._identifiers)
+
+    @staticmethod
+    def parse_identifier(inspection_id: str) -> str:
+        """Parse identifier from the inspection id of the form `inspection-<identifier>-<hash>`."""
+        return inspection_id.partition("-")[2].rpartition("-")[0]
+
+    def update(self, inspection_ids: typing.Iterable[str]) -> int:
+        """Add new inspection ids to the index, return number of ids added."""
+        first_seen = time.time()
+
+        n_added = 0
+        for inspection_id in inspection_ids:
+            if inspection_id in self._first_seen:
+                continue
+
+            self._first_seen[inspection_id] = first_seen
+            self._add(inspection_id)
+
+            n_added += 1
+
+        if n_added and self.path is not None:
+            self.save()
+
+        return n_added
+
+    def remove(self, inspection_ids: typing.Iterable[str]) -> int:
+        """Remove inspection ids from the index, return number of ids removed."""
+        removed = {inspection_id for inspection_id in inspection_ids if inspection_id in self._first_seen}
+        if not removed:
+            return 0
+
+        for inspection_id in removed:
+            del self._first_seen[inspection_id]
+
+        self._identifiers = {}
+        for inspection_id in self._first_seen:
+            self._add(inspection_id)
+
+        if self.path is not None:
+            self.save()
+
+        return len(removed)
+
+    def refresh(self, inspection_store) -> int:
+        """Synchronize the index with the listing of the given inspection store, return number of ids added.
+
+        Inspection ids no longer listed by the store (e.g. removed inspections) are dropped from the index.
+        """
+        inspection_ids = set(inspection_store.get_document_listing())
+
+        n_removed = self.remove(set(self._first_seen) - inspection_ids)
+        n_added = self.update(inspection_ids)
+        logger.info(
+            f"Inspection id index refreshed, {n_added} new and {n_removed} removed inspection ids, {len(self)} in total"
+        )
+
+        return n_added
+
+    def filter(
+        self, identifiers: typing.Iterable[str], created_after: datetime.datetime = None
+    ) -> typing.Dict[str, typing.List[str]]:
+        """Get inspection ids of the given identifiers, optionally only those first seen after `created_after`.
+
+        Inspection ids can be filtered by `created_after` only using a persisted index and only after the time
+        the index was built, the time of creation of the inspection ids listed when building the index is unknown.
+        """
+        filtered_ids = {identifier: list(self[identifier]) for identifier in identifiers}
+
+        if created_after is not None:
+            if self.path is None:
+                raise ValueError("Inspection ids can NOT be filtered by `created_after` using a non-persisted index")
+
+            timestamp = created_after.timestamp()
+            if self.built_at is not None and timestamp < self.built_at:
+                built_at = datetime.datetime.fromtimestamp(self.built_at)
+                raise ValueError(
+                    f"Inspection ids can NOT be filtered by `created_after` preceding the time the index was built: "
+                    f"{built_at}, time of creation of the inspection ids listed by then is unknown"
+                )
+
+            filtered_ids = {
+                identifier: [ids for ids in inspection_ids if self._first_seen[ids] > timestamp]
+                for identifier, inspection_ids in filtered_ids.items()
+            }
+
+        return filtered_ids
+
+    def save(self):
+        """Persist the index in the cache directory."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._first_seen, f)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        os.replace(tmp_path, self.path)
+
+    def _add(self, inspection_id: str):
+        identifier = self.parse_identifier(inspection_id)
+
+        if identifier:
+            self._identifiers.setdefault(identifier, []).append(inspection_id)
@@ -16,9 +16,17 @@
 
 """Inspection results processing and analysis."""
 
+import collections
+import datetime
 import functools
+import itertools
+import json
 import logging
+import math
+import random
 import re
+import threading
+import time
 
 import numpy as np
 import pandas as pd
@@ -30,13 +38,16 @@ import cufflinks as cf
 import plotly
 import plotly.offline as py
 
-from pandas_profiling import ProfileReport as profile
 from pandas.io.json import json_normalize
 
 from prettyprinter import pformat
 
 from typing import Any, Dict, List, Tuple, Union
-from typing import Callable, Iterable
+from typing import Callable, Iterable, Iterator
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 from plotly import graph_objs as go
 from plotly import figure_factory as ff
@@ -46,13 +57,21 @@ import matplotlib
 import matplotlib.pyplot as plt
 
 from thoth.storages import InspectionResultsStore
+from thoth.lab.cache import InspectionDocumentCache
+from thoth.lab.cache import InspectionIdIndex
 from thoth.lab.utils import group_index
+from thoth.lab.utils import NestedValueHasher
+from thoth.lab.utils import nested_value_hasher
+from thoth.lab.utils import rproject
 
 logger = logging.getLogger("thoth.lab.inspection")
 
 # cufflinks should be in offline mode
 cf.go_offline()
 
+# each fetching thread keeps its own connection to Ceph
+_THREAD_LOCAL = threading.local()
+
 
 def extract_structure_json(input_json: dict, upper_key: str, depth: int, json_structure):
     """Convert a json file structure into a list with rows showing tree depths, keys and values.
@@ -102,57 +121,363 @@ def extract_keys_from_dataframe(df: pd.DataFrame, key: str):
     return ndf
 
 
-def filter_inspection_ids_list(inspection_identifier_list: List[str]) -> dict:
+def _get_inspection_document_cache(
+    cache: Union[bool, InspectionDocumentCache] = True
+) -> Union[InspectionDocumentCache, None]:
+    """Get local cache of inspection documents, `True` stands for the default cache, `False` disables caching."""
+    if cache is True:
+        return InspectionDocumentCache()
+
+    return cache if cache is not False else None
+
+
+def filter_inspection_ids_list(
+    inspection_identifier_list: List[str],
+    *,
+    inspection_store: InspectionResultsStore = None,
+    cache: Union[bool, InspectionDocumentCache] = True,
+    index: Union[bool, InspectionIdIndex] = False,
+    refresh: bool = True,
+    created_after: datetime.datetime = None,
+) -> dict:
     """Filter inspection ids list according to the inspection identifier selected.
 
     :param inspection_identifier_list: list of identifier to filter out inspection ids
+    :param inspection_store: store to list the documents from, connects to Ceph if not provided
+    :param cache: local cache of inspection documents used to report how many of the selected documents are
+        already available locally, `True` uses the default cache, `False` disables caching
+    :param index: index of inspection ids by identifier, `True` uses the default persisted index,
+        `False` builds an in-memory index from a full listing of the store
+    :param refresh: refresh the index from the listing of the store, new ids are indexed and removed ids dropped
+    :param created_after: select only inspection ids first seen by the index after the given time
+
+        The index does not know when the inspections were created, it records when an inspection id
+        was first seen instead. Hence `created_after` applies only to ids picked up by refreshes of a persisted
+        index made after it was built, the ids of the initial listing are all stamped with the time the index
+        was built. A ValueError is raised if `created_after` precedes that time or if the index is not persisted.
     """
-    inspection_store = InspectionResultsStore()
-    inspection_store.connect()
-    logger.info(f"Retrieving all inspection ids")
-    inspection_ids_list = list(inspection_store.get_document_listing())
+    if created_after is not None and index is False:
+        raise ValueError("Inspection ids can NOT be filtered by `created_after` using a non-persisted index")
 
-    filtered_list_ids = {}
+    if index is True:
+        index = InspectionIdIndex()
+    elif index is False:
+        index = InspectionIdIndex(persist=False)
+        refresh = True
 
-    for identifier in inspection_identifier_list:
-        filtered_list_ids[identifier] = []
+    if refresh:
+        if inspection_store is None:
+            inspection_store = InspectionResultsStore()
+            inspection_store.connect()
 
-    for ids in inspection_ids_list:
-        inspection_filter = "-".join(ids.split("-")[1:(len(ids.split("-")) - 1)])
+        logger.info(f"Retrieving all inspection ids")
+        index.refresh(inspection_store)
 
-        if inspection_filter:
-            if inspection_filter in inspection_identifier_list:
-                filtered_list_ids[inspection_filter].append(ids)
+    cache = _get_inspection_document_cache(cache)
+
+    filtered_list_ids = index.filter(inspection_identifier_list, created_after=created_after)
 
     tot_inspections_selected = sum([len(batch_n) for batch_n in filtered_list_ids.values()])
     inspection_batches = [(batch_name, len(batch_count)) for batch_name, batch_count in filtered_list_ids.items()]
     logger.info(f"There are {tot_inspections_selected} inspection runs selected: {inspection_batches} respectively")
 
+    if cache is not None:
+        tot_inspections_cached = sum(ids in cache for batch_n in filtered_list_ids.values() for ids in batch_n)
+        logger.info(f"{tot_inspections_cached}/{tot_inspections_selected} inspection runs are cached locally")
+
     return filtered_list_ids
 
 
+class _SchemaDrift(Exception):
+    """Raised when a document does not match the flattening schema."""
+
+
+def _compile_schema_paths(node: dict, path: Tuple[str, ...] = ()) -> List[Tuple[str, ...]]:
+    paths = []
+    for key, value in node.items():
+        if isinstance(value, dict):
+            paths.extend(_compile_schema_paths(value, (*path, key)))
+        else:
+            paths.append((*path, key))
+
+    return paths
+
+
+def _compile_top_level_schema_paths(document: dict) -> List[Tuple[str, ...]]:
+    # mimic column order of `json_normalize`: top-level leaves come first and flattened records are appended,
+    # nested levels keep the document order
+    leaves = [(key,) for key, value in document.items() if not isinstance(value, dict)]
+    nested = [_compile_schema_paths(value, (key,)) for key, value in document.items() if isinstance(value, dict)]
+
+    return leaves + [p for paths in nested for p in paths]
+
+
+def compile_flatten_schema(
+    sample: Union[dict, List[list]], sep: str = "__"
+) -> List[Tuple[str, Tuple[str, ...]]]:
+    """Compile flattening schema from a sample document or from `extract_structure_json` output.
+
+    Note that empty records can't be told apart from empty lists in the `extract_structure_json` output,
+    hence they are compiled into (empty) columns.
+
+    :param sample: sample inspection document or list of rows as returned by `extract_structure_json`
+    :param sep: separator of nested keys in column names
+    :return: list of (column, path) accessors
+    """
+    if not isinstance(sample, dict):
+        # reconstruct document skeleton from the structure rows
+        root = next(upper_key for depth, upper_key, _, _ in sample if depth == 1)
+        parents = {upper_key for _, upper_key, _, _ in sample}
+
+        skeleton = {}
+        for _, upper_key, key, _ in sample:
+            path = [k for k in upper_key[len(root):].split("__") if k]
+
+            node = skeleton
+            for k in path:
+                node = node.setdefault(k, {})
+
+            is_record = f"{upper_key}__{key}" in parents
+            node.setdefault(key, {} if is_record else None)
+
+        sample = skeleton
+
+    return [(sep.join(path), path) for path in _compile_top_level_schema_paths(sample)]
+
+
+def _compile_schema_tree(schema: List[Tuple[str, Tuple[str, ...]]]) -> dict:
+    """Compile schema into a tree of keys, leaves hold index of the column."""
+    tree = {}
+    for idx, (_, path) in enumerate(schema):
+        *parents, leaf = path
+
+        node = tree
+        for key in parents:
+            node = node.setdefault(key, {})
+
+        node[leaf] = idx
+
+    return tree
+
+
+def _fill_record(record: dict, tree: dict, row: int, columns: List[list]):
+    n_found = 0
+    for key, subtree in tree.items():
+        if key not in record:
+            continue
+
+        n_found += 1
+        value = record[key]
+
+        if isinstance(subtree, dict):
+            if not isinstance(value, dict):
+                raise _SchemaDrift(key)
+
+            _fill_record(value, subtree, row, columns)
+
+        elif isinstance(value, dict):
+            if value:
+                raise _SchemaDrift(key)
+        else:
+            columns[subtree][row] = value
+
+    if n_found != len(record):
+        raise _SchemaDrift(f"Unexpected keys: {set(record) - set(tree)}")
+
+
+def _flatten_with_schema(
+    inspection_results: List[dict], schema: List[Tuple[str, Tuple[str, ...]]]
+) -> pd.DataFrame:
+    tree = _compile_schema_tree(schema)
+    columns = [[np.nan] * len(inspection_results) for _ in schema]
+
+    for row, record in enumerate(inspection_results):
+        _fill_record(record, tree, row, columns)
+
+    return pd.DataFrame(dict(zip((col for col, _ in schema), columns)), columns=[col for col, _ in schema])
+
+
+def flatten_inspection_results(
+    inspection_results: List[dict], schema: List[Tuple[str, Tuple[str, ...]]] = None, sep: str = "__"
+) -> pd.DataFrame:
+    """Flatten inspection documents into pd.DataFrame using precompiled schema.
+
+    The result is the same as of `json_normalize(inspection_results, sep=sep)`, which is used as a fallback
+    if the documents do not match the schema.
+
+    :param inspection_results: list of inspection documents
+    :param schema: schema as returned by `compile_flatten_schema`, compiled from the first document if not provided
+    :param sep: separator of nested keys in column names
+    """
+    if not inspection_results:
+        return pd.DataFrame()
+
+    schema = schema or compile_flatten_schema(inspection_results[0], sep=sep)
+
+    try:
+        return _flatten_with_schema(inspection_results, schema)
+    except _SchemaDrift as exc:
+        logger.debug(f"Inspection results do not match the schema ({exc!s}), falling back to `json_normalize`")
+
+    return json_normalize(inspection_results, sep=sep)
+
+
+def _normalize_inspection_results(
+    inspection_results: Union[List[dict], Iterable[List[dict]]]
+) -> Tuple[pd.DataFrame, List[str]]:
+    """Normalize inspection results chunk by chunk, return the normalized pd.DataFrame and top-level keys."""
+    inspection_results = iter(inspection_results)
+    first = next(inspection_results, None)
+
+    if first is None:
+        return pd.DataFrame(), []
+
+    if isinstance(first, dict):
+        chunks = [[first, *inspection_results]]
+    else:
+        chunks = itertools.chain([first], inspection_results)
+
+    keys = []
+    frames = []
+    schema = None
+    for chunk in chunks:
+        if not chunk:
+            continue
+
+        if not keys:
+            keys = list(chunk[0])
+            schema = compile_flatten_schema(chunk[0])
+
+        df = None
+        if schema is not None:
+            try:
+                df = _flatten_with_schema(chunk, schema)
+            except _SchemaDrift as exc:
+                logger.debug(f"Inspection results do not match the schema ({exc!s}), falling back to `json_normalize`")
+                schema = None
+
+        if df is None:
+            df = json_normalize(chunk, sep="__")
+
+        frames.append(df)  # each row resembles InspectionResult
+
+    if not frames:
+        return pd.DataFrame(), keys
+
+    df = pd.concat(frames, ignore_index=True, sort=False) if len(frames) > 1 else frames[0]
+
+    return df, keys
+
+
+def detect_constant_columns(df: pd.DataFrame, exclude: str = "version") -> pd.DataFrame:
+    """Detect columns of the pd.DataFrame which contain at most a single distinct value.
+
+    Missing values count as a distinct value, hence columns with a single value and missing values are kept.
+    Columns containing unhashable values (lists, dicts, ...) are not supported and are always kept.
+
+    :param df: pd.DataFrame to check
+    :param exclude: regex of columns which are always kept, versions are kept explicitly by default
+    :return: pd.DataFrame indexed by rejected column names with the constant value and the reason of rejection
+    """
+    rejected = {"value": [], "reason": []}
+    rejected_columns = []
+
+    for col in df.columns:
+        if exclude and re.search(exclude, col):
+            continue
+
+        values = df[col].values
+        if len(values) <= 0:
+            continue
+
+        is_na = pd.isna(values)
+        if is_na.all():
+            rejected_columns.append(col)
+            rejected["value"].append(None)
+            rejected["reason"].append("all values missing")
+
+            continue
+
+        if is_na.any():
+            continue
+
+        first = values[0]
+        if values.dtype == object:
+            try:
+                hash(first)
+            except TypeError:
+                continue  # unsupported
+
+            is_constant = all(v == first for v in values)
+        else:
+            is_constant = bool((values == first).all())
+
+        if is_constant:
+            rejected_columns.append(col)
+            rejected["value"].append(first)
+            rejected["reason"].append("constant")
+
+    return pd.DataFrame(rejected, index=pd.Index(rejected_columns, dtype=object), columns=["value", "reason"])
+
+
+_DATETIME_COLUMNS_REGEX = "created|started_at|finished_at"
+
+
+def process_inspection_timestamps(df: pd.DataFrame, datetime_format: str = None) -> pd.DataFrame:
+    """Parse timestamps of the inspection pd.DataFrame and compute job and build durations in seconds.
+
+    Each timestamp column is parsed at once, the durations are stored as `status__{job,build}__duration`
+    columns so that they never have to be computed again.
+
+    :param df: inspection pd.DataFrame as returned by `json_normalize`
+    :param datetime_format: format of the timestamps, inferred if not provided or if the parsing fails
+    """
+    for col in df.filter(regex=_DATETIME_COLUMNS_REGEX).columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+
+        try:
+            df[col] = pd.to_datetime(df[col], format=datetime_format)
+        except ValueError:
+            logger.debug(f"Timestamps of column {col!r} do not match format {datetime_format!r}, inferring format")
+            df[col] = pd.to_datetime(df[col])
+
+    for stage in ("job", "build"):
+        started_at, finished_at = f"status__{stage}__started_at", f"status__{stage}__finished_at"
+
+        if started_at in df.columns and finished_at in df.columns:
+            df[f"status__{stage}__duration"] = (df[finished_at] - df[started_at]).dt.total_seconds()
+
+    return df
+
+
 def process_inspection_results(
-    inspection_results: List[dict],
+    inspection_results: Union[List[dict], Iterable[List[dict]]],
     exclude: Union[list, set] = None,
     apply: List[Tuple] = None,
     drop: bool = True,
     verbose: bool = False,
+    datetime_format: str = None,
 ) -> pd.DataFrame:
-    """Process inspection result into pd.DataFrame."""
-    if not inspection_results:
-        return ValueError("Empty iterable provided.")
+    """Process inspection result into pd.DataFrame.
+
+    :param inspection_results: list of inspection documents or an iterable of chunks of inspection documents
+        as yielded by `iter_inspection_results` with `chunk_size` set, chunks are normalized one at a time
+        so that only a single chunk of the raw documents is kept in memory
+    :param exclude: top-level keys excluded from constant columns detection
+    :param apply: list of (regex, func) tuples, `func` is applied to each value of the columns matching `regex`
+    :param drop: drop constant columns, see `detect_constant_columns`
+    :param verbose: print rejected constant columns together with their value and the reason of rejection
+    :param datetime_format: format of the timestamps, see `process_inspection_timestamps`
+    """
+    df, keys = _normalize_inspection_results(inspection_results)
 
-    datetime_spec = ("created|started_at|finished_at", pd.to_datetime)
-    if apply is None:
-        apply = [datetime_spec]
-    else:
-        apply = [*apply, datetime_spec]
+    if not keys:
+        return ValueError("Empty iterable provided.")
 
     exclude = exclude or []
     apply = apply or ()
 
-    df = json_normalize(inspection_results, sep="__")  # each row resembles InspectionResult
-
     if len(df) <= 1:
         return df
 
@@ -160,38 +485,226 @@ def process_inspection_results(
         for col in df.filter(regex=regex).columns:
             df[col] = df[col].apply(func)
 
-    keys = [k for k in inspection_results[0] if k not in exclude]
-    for k in keys:
-        if k in exclude:
-            continue
-        d = df.filter(regex=k)
-        p = profile(d)
+    df = process_inspection_timestamps(df, datetime_format=datetime_format)
 
-        rejected = (
-            p.description_set["variables"]
-            .query("distinct_count <= 1 & type != 'UNSUPPORTED'")
-            .filter(regex="^((?!version).)*$", axis=0)
-        )  # explicitly include versions
+    keys = [k for k in keys if k not in exclude]
+    columns = pd.Index([]).append([df.filter(regex=k).columns for k in keys]).unique()
 
-        if verbose:
-            print("Rejected columns: ", rejected.index)
+    rejected = detect_constant_columns(df[columns], exclude="version|__duration$")
 
-        if drop:
-            df.drop(rejected.index, axis=1, inplace=True)
+    if verbose:
+        print("Rejected columns:")
+        print(rejected.to_string() if len(rejected) else "None")
 
-    df = df.eval(
-        "status__job__duration   = status__job__finished_at   - status__job__started_at", engine="python"
-    ).eval("status__build__duration = status__build__finished_at - status__build__started_at", engine="python")
+    if drop:
+        df.drop(rejected.index, axis=1, inplace=True)
 
     return df
 
 
+def _get_thread_inspection_store() -> InspectionResultsStore:
+    """Get inspection store connected for the current thread."""
+    inspection_store = getattr(_THREAD_LOCAL, "inspection_store", None)
+
+    if inspection_store is None:
+        inspection_store = InspectionResultsStore()
+        inspection_store.connect()
+        _THREAD_LOCAL.inspection_store = inspection_store
+
+    return inspection_store
+
+
+_TRANSIENT_CEPH_ERROR_CODES = {
+    "InternalError",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+}
+
+
+def _is_transient_error(exc: Exception) -> bool:
+    """Check whether the retrieval error is transient (connection, timeout or server-side error)."""
+    if isinstance(exc, OSError):
+        return not isinstance(exc, (FileNotFoundError, PermissionError))
+
+    try:
+        import botocore.exceptions
+    except ImportError:
+        return False
+
+    if isinstance(exc, (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError)):
+        return True
+
+    if isinstance(exc, botocore.exceptions.ClientError):
+        error_code = exc.response.get("Error", {}).get("Code")
+        status_code = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+
+        return error_code in _TRANSIENT_CEPH_ERROR_CODES or status_code >= 500
+
+    return False
+
+
+def _fetch_inspection_document(
+    inspection_id: str, inspection_store: InspectionResultsStore = None, retries: int = 3, backoff: float = 0.5
+) -> dict:
+    """Fetch inspection document from Ceph, retry with exponential backoff if the retrieval fails.
+
+    Only transient errors (connection, timeout and server-side errors) are retried, other errors
+    such as a missing document are propagated immediately.
+
+    :param inspection_id: id of the inspection document to retrieve
+    :param inspection_store: store to retrieve the document from, thread-local Ceph store is used if not provided
+    :param retries: number of retries before the error is propagated
+    :param backoff: initial delay in seconds between retries, doubled after each failed attempt
+    """
+    inspection_store = inspection_store or _get_thread_inspection_store()
+
+    for attempt in range(retries + 1):
+        try:
+            return inspection_store.retrieve_document(inspection_id)
+        except Exception as exc:
+            if attempt >= retries or not _is_transient_error(exc):
+                raise
+
+            delay = backoff * 2 ** attempt
+            logger.warning(f"Failed to retrieve {inspection_id!r}: {exc!s}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _retrieve_inspection_document(
+    inspection_id: str, cache: InspectionDocumentCache = None, fields: List[str] = None, **fetch_kwargs: Any
+) -> dict:
+    """Retrieve inspection document from the local cache or from Ceph.
+
+    :param inspection_id: id of the inspection document to retrieve
+    :param cache: local cache of inspection documents, documents are always fetched from Ceph if not provided
+    :param fields: project the document on the given fields declared by dot notation accessors, see `rproject`
+    :param fetch_kwargs: keyword arguments passed to `_fetch_inspection_document`
+    """
+    fetch = functools.partial(_fetch_inspection_document, **fetch_kwargs)
+
+    if cache is not None:
+        document = cache.retrieve(inspection_id, fetch)
+    else:
+        document = fetch(inspection_id)
+
+    if fields is not None:
+        return rproject(document, fields)
+
+    # pop build logs to save some memory (not necessary for now)
+    document["build_log"] = None
+
+    return document
+
+
+def iter_inspection_results(
+    inspection_ids: List[str],
+    chunk_size: int = None,
+    *,
+    inspection_store: InspectionResultsStore = None,
+    max_workers: int = 1,
+    retries: int = 3,
+    backoff: float = 0.5,
+    cache: Union[bool, InspectionDocumentCache] = True,
+    fields: List[str] = None,
+    executor: ThreadPoolExecutor = None,
+) -> Iterator[Union[dict, List[dict]]]:
+    """Iterate over inspection documents stored in Ceph in the order of the given inspection ids.
+
+    At most `chunk_size + 2 * max_workers` documents are held in memory at once.
+
+    :param inspection_ids: ids of the inspection documents to retrieve, usually of a single identifier
+    :param chunk_size: yield lists of up to `chunk_size` documents instead of single documents
+    :param inspection_store: store to retrieve the documents from, each thread connects to Ceph if not provided
+    :param max_workers: maximum number of documents retrieved concurrently
+    :param retries, backoff: retry policy for failed retrievals, see `_fetch_inspection_document`
+    :param cache: local cache of inspection documents, `True` uses the default cache, `False` disables caching
+    :param fields: keep only the given fields of each document, declared by dot notation accessors
+        (i.e. `["status", "job_log.hwinfo"]`), the projection is applied as soon as the document is loaded
+    :param executor: executor to retrieve the documents by, pass the same executor to subsequent calls to reuse
+        its threads and their Ceph connections, a new executor of `max_workers` threads is used if not provided
+    """
+    retrieve = functools.partial(
+        _retrieve_inspection_document,
+        cache=_get_inspection_document_cache(cache),
+        fields=fields,
+        inspection_store=inspection_store,
+        retries=retries,
+        backoff=backoff,
+    )
+
+    if executor is not None:
+        yield from _iter_retrieved_documents(executor, retrieve, inspection_ids, chunk_size, window=2 * max_workers)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from _iter_retrieved_documents(executor, retrieve, inspection_ids, chunk_size, window=2 * max_workers)
+
+
+def _iter_retrieved_documents(
+    executor: ThreadPoolExecutor,
+    retrieve: Callable[[str], dict],
+    inspection_ids: Iterable[str],
+    chunk_size: int = None,
+    window: int = 2,
+) -> Iterator[Union[dict, List[dict]]]:
+    # keep a bounded window of documents being retrieved ahead of the consumer
+    inspection_ids = iter(inspection_ids)
+    pending = collections.deque(
+        executor.submit(retrieve, inspection_id) for inspection_id in itertools.islice(inspection_ids, window)
+    )
+
+    chunk = []
+    while pending:
+        document = pending.popleft().result()
+
+        for inspection_id in itertools.islice(inspection_ids, 1):
+            pending.append(executor.submit(retrieve, inspection_id))
+
+        if not chunk_size:
+            yield document
+            continue
+
+        chunk.append(document)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
 def aggregate_inspection_results_dict(
-    list_ids: List[str], identifier_inspection: List[str], limit_results: bool = False
+    list_ids: List[str],
+    identifier_inspection: List[str],
+    limit_results: bool = False,
+    *,
+    inspection_store: InspectionResultsStore = None,
+    max_workers: int = 1,
+    retries: int = 3,
+    backoff: float = 0.5,
+    cache: Union[bool, InspectionDocumentCache] = True,
+    fields: List[str] = None,
 ) -> dict:
-    """Aggregate inspection results per identifier from inspection documents stored in Ceph."""
-    inspection_store = InspectionResultsStore()
-    inspection_store.connect()
+    """Aggregate inspection results per identifier from inspection documents stored in Ceph.
+
+    Documents are retrieved concurrently by a pool of `max_workers` threads, the order
+    of the documents for each identifier is the same as the order of the ids in `list_ids`.
+    Use `iter_inspection_results` to avoid keeping all the documents in memory.
+
+    :param list_ids: inspection ids per identifier as returned by `filter_inspection_ids_list`
+    :param identifier_inspection: list of identifiers to aggregate
+    :param limit_results: limit results to 5 per batch to test functions
+    :param inspection_store: store to retrieve the documents from, each thread connects to Ceph if not provided
+    :param max_workers: maximum number of documents retrieved concurrently
+    :param retries, backoff: retry policy for failed retrievals, see `_fetch_inspection_document`
+    :param cache: local cache of inspection documents, `True` uses the default cache, `False` disables caching
+    :param fields: keep only the given fields of each document, see `iter_inspection_results`
+    """
+    cache = _get_inspection_document_cache(cache)
 
     inspection_results_dict = {}
     tot = sum([len(r) for r in list_ids.values()])
@@ -200,24 +713,68 @@ def aggregate_inspection_results_dict(
     if limit_results:
         logger.info(f"Limiting results to 5 per batch to test functions!!")
 
-    for identifier in identifier_inspection:
-        inspection_results_dict[identifier] = []
-        logger.info("Analyzing inspection identifer batch: %r", identifier)
-        for n, ids in enumerate(list_ids[identifier]):
-            document = inspection_store.retrieve_document(ids)
-            # pop build logs to save some memory (not necessary for now)
-            document["build_log"] = None
-            logger.info(f"Analysis n.{n + 1 + current_identifier_batch_length}/{tot}")
-            inspection_results_dict[identifier].append(document)
-            if limit_results:
-                if n + 1 == 5:
-                    break
-
-        current_identifier_batch_length += len(list_ids[identifier])
+    # threads of the executor (and so their Ceph connections) are shared by all the identifiers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for identifier in identifier_inspection:
+            inspection_results_dict[identifier] = []
+            logger.info("Analyzing inspection identifer batch: %r", identifier)
+
+            inspection_ids = list_ids[identifier][:5] if limit_results else list_ids[identifier]
+            documents = iter_inspection_results(
+                inspection_ids,
+                inspection_store=inspection_store,
+                max_workers=max_workers,
+                retries=retries,
+                backoff=backoff,
+                cache=cache,
+                fields=fields,
+                executor=executor,
+            )
+            for n, document in enumerate(documents):
+                logger.info(f"Analysis n.{n + 1 + current_identifier_batch_length}/{tot}")
+                inspection_results_dict[identifier].append(document)
+
+            current_identifier_batch_length += len(list_ids[identifier])
+
+    if cache is not None:
+        logger.info(f"Inspection document cache hits: {cache.hits}, misses: {cache.misses}")
 
     return inspection_results_dict
 
 
+def compute_duration_stats(
+    data: pd.DataFrame, columns: Iterable[str] = ("job_duration", "build_duration"), level: Union[int, List[int]] = None
+) -> pd.DataFrame:
+    """Compute mean and standard deviation bounds of the duration columns, optionally per group of index levels.
+
+    For each column `<col>` the columns `<col>_mean`, `<col>_upper_bound` and `<col>_lower_bound` are added.
+    Mean and standard deviation are computed once per group with `groupby.transform`, the bounds
+    are then derived by vectorized arithmetic over the whole DataFrame.
+
+    :param data: DataFrame containing the duration columns
+    :param columns: duration columns to compute the statistics for, missing columns are skipped
+    :param level: index level(s) to group by, statistics are computed over the whole DataFrame if not provided
+    """
+    data = data.copy()
+
+    columns = [col for col in columns if col in data.columns]
+    if not columns:
+        return data
+
+    if level is not None:
+        grouped = data[columns].groupby(level=level, sort=False)
+        mean, std = grouped.transform("mean"), grouped.transform("std")
+    else:
+        mean, std = data[columns].mean(), data[columns].std()
+
+    for col in columns:
+        data[f"{col}_mean"] = mean[col]
+        data[f"{col}_upper_bound"] = data[col] + std[col]
+        data[f"{col}_lower_bound"] = data[col] - std[col]
+
+    return data
+
+
 def create_duration_dataframe(inspection_df: pd.DataFrame) -> pd.DataFrame:
     """Compute statistics and duration DataFrame."""
     if len(inspection_df) <= 0:
@@ -231,24 +788,14 @@ def create_duration_dataframe(inspection_df: pd.DataFrame) -> pd.DataFrame:
     data = (
         inspection_df.filter(like="duration")
         .rename(columns=lambda s: s.replace("status__", "").replace("__", "_"))
-        .apply(lambda ts: pd.to_timedelta(ts).dt.total_seconds())
+        .apply(lambda ts: ts.dt.total_seconds() if pd.api.types.is_timedelta64_dtype(ts) else ts)
     )
 
-    def compute_duration_stats(group):
-        return (
-            group.eval("job_duration_mean      = job_duration.mean()", engine="python")
-            .eval("job_duration_upper_bound    = job_duration + job_duration.std()", engine="python")
-            .eval("job_duration_lower_bound    = job_duration - job_duration.std()", engine="python")
-            .eval("build_duration_mean         = build_duration.mean()", engine="python")
-            .eval("build_duration_upper_bound  = build_duration + build_duration.std()", engine="python")
-            .eval("build_duration_lower_bound  = build_duration - build_duration.std()", engine="python")
-        )
-
     if isinstance(inspection_df.index, pd.MultiIndex):
         n_levels = len(inspection_df.index.levels)
 
         # compute duration stats for each group separately
-        data = data.groupby(level=list(range(n_levels - 1)), sort=False).apply(compute_duration_stats)
+        data = compute_duration_stats(data, level=list(range(n_levels - 1)))
     else:
         data = compute_duration_stats(data)
 
@@ -285,11 +832,11 @@ def create_duration_scatter_with_bounds(
     data: pd.DataFrame, col: str, index: Union[list, pd.Index, pd.RangeIndex] = None, **kwargs
 ):
     """Create duration Scatter plot with upper and lower bounds."""
-    df_duration = (
-        data[[col]]
-        .eval(f"upper_bound = {col} + {col}.std()", engine="python")
-        .eval(f"lower_bound = {col} - {col}.std()", engine="python")
-    )
+    df_duration = data[[col]].copy()
+
+    std = df_duration[col].std()
+    df_duration["upper_bound"] = df_duration[col] + std
+    df_duration["lower_bound"] = df_duration[col] - std
 
     index = index if index is not None else df_duration.index
 
@@ -524,8 +1071,14 @@ def make_subplots(data: pd.DataFrame, columns: List[str] = None, *, kind: str =
     return sub_plots
 
 
-def show_categories(inspection_df: pd.DataFrame):
-    """List categories in the given inspection pd.DataFrame."""
+def show_categories(inspection_df: pd.DataFrame, restore_nested: Union[bool, NestedValueHasher] = False):
+    """List categories in the given inspection pd.DataFrame.
+
+    :param restore_nested: whether to restore original values of nested values grouped by their digests
+        (see `hash_nested` parameter of `_.groupby`), values are restored by the given hasher
+        or by `utils.nested_value_hasher` if set to True
+    """
+    hasher = restore_nested if isinstance(restore_nested, NestedValueHasher) else nested_value_hasher
     index = inspection_df.index.droplevel(-1).unique()
 
     results_categories = {}
@@ -535,11 +1088,13 @@ def show_categories(inspection_df: pd.DataFrame):
         class_results = {}
         if len(index.names) > 1:
             for name, ind in zip(index.names, idx):
+                ind = hasher.restore(ind) if restore_nested else ind
                 logger.debug(f"{name} : {ind}")
                 class_results[name] = ind
         else:
-            logger.debug(f"{index.names[0]} : {idx}")
-            class_results[index.names[0]] = idx
+            ind = hasher.restore(idx) if restore_nested else idx
+            logger.debug(f"{index.names[0]} : {ind}")
+            class_results[index.names[0]] = ind
         results_categories[n + 1] = class_results
 
         frame = inspection_df.loc[idx]
@@ -548,28 +1103,254 @@ def show_categories(inspection_df: pd.DataFrame):
     return results_categories
 
 
-def create_inspection_results_df_dict(inspection_results_dict: dict) -> dict:
+def compact_inspection_dataframe(
+    df: pd.DataFrame, max_cardinality_ratio: float = 0.5, downcast_floats: bool = False, inplace: bool = False
+) -> pd.DataFrame:
+    """Reduce memory usage of the inspection pd.DataFrame.
+
+    Object columns with low cardinality (repeated strings such as platform, processor flags, base image
+    or script sha256) are converted to `category` dtype, integer columns are downcast to the smallest
+    integer dtype. Columns of unhashable values (lists, dicts, ...) are left untouched.
+
+    :param df: inspection pd.DataFrame as returned by `process_inspection_results`
+    :param max_cardinality_ratio: maximum ratio of distinct values to the number of rows
+        of an object column to be converted to `category`
+    :param downcast_floats: whether to downcast float columns to float32 as well, precision is lost
+    :param inplace: whether to modify the given pd.DataFrame instead of a copy
+    """
+    if not inplace:
+        df = df.copy()
+
+    memory_usage = df.memory_usage(deep=True).sum()
+
+    for col in df.columns:
+        column = df[col]
+
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            continue
+
+        if column.dtype == object or pd.api.types.is_string_dtype(column):
+            try:
+                n_unique = column.nunique(dropna=False)
+            except TypeError:
+                continue  # unhashable values
+
+            if n_unique > max_cardinality_ratio * len(column):
+                continue
+
+            try:
+                df[col] = column.astype("category")
+            except TypeError:
+                logger.debug(f"Column {col!r} could NOT be converted to category")
+
+        elif pd.api.types.is_integer_dtype(column):
+            df[col] = pd.to_numeric(column, downcast="integer")
+
+        elif downcast_floats and pd.api.types.is_float_dtype(column):
+            df[col] = pd.to_numeric(column, downcast="float")
+
+    compacted_memory_usage = df.memory_usage(deep=True).sum()
+    logger.info(
+        f"Inspection DataFrame compacted from {memory_usage / 1024 ** 2:.2f} MiB "
+        f"to {compacted_memory_usage / 1024 ** 2:.2f} MiB, "
+        f"saved {(memory_usage - compacted_memory_usage) / 1024 ** 2:.2f} MiB"
+    )
+
+    return df
+
+
+def _create_inspection_results_df(inspection_results_list: List[dict], compact: bool = False) -> pd.DataFrame:
+    """Create pd.DataFrame of inspection results of a single inspection identifier."""
+    df = process_inspection_results(
+        inspection_results_list, exclude=["build_log", "created", "inspection_id"], drop=False
+    )
+
+    df_duration = create_duration_dataframe(df)
+    df["job_duration"] = df_duration["job_duration"]
+    df["build_duration"] = df_duration["build_duration"]
+
+    if compact:
+        df = compact_inspection_dataframe(df, inplace=True)
+
+    return df
+
+
+def create_inspection_results_df_dict(
+    inspection_results_dict: dict, *, max_workers: int = 1, compact: bool = False
+) -> dict:
     """Create dictionary with pd.Dataframe of inspection results for each inspection identifier.
 
     :param inspection_results: dictionary containing inspection results retrieved from Ceph.
+    :param max_workers: number of processes the inspection identifiers are processed by in parallel,
+        the identifiers are processed sequentially in the current process if set to 1
+    :param compact: whether to reduce memory usage of the DataFrames, see `compact_inspection_dataframe`
     """
-    inspection_results_df_dict = {}
+    if max_workers == 1:
+        inspection_results_df_dict = {}
+
+        for identifier, inspection_results_list in inspection_results_dict.items():
+            logger.info(f"Analyzing inspection batch: {identifier}")
+            inspection_results_df_dict[identifier] = _create_inspection_results_df(
+                inspection_results_list, compact=compact
+            )
 
-    for identifier, inspection_results_list in inspection_results_dict.items():
-        logger.info(f"Analyzing inspection batch: {identifier}")
+        return inspection_results_df_dict
 
-        df = process_inspection_results(
-            inspection_results_list,
-            exclude=["build_log", "created", "inspection_id"],
-            apply=[("created|started_at|finished_at", pd.to_datetime)],
-            drop=False,
+    logger.info(f"Analyzing {len(inspection_results_dict)} inspection batches using {max_workers} processes")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        dfs = executor.map(
+            functools.partial(_create_inspection_results_df, compact=compact), inspection_results_dict.values()
         )
 
-        inspection_results_df_dict[identifier] = df
+        return dict(zip(inspection_results_dict, dfs))
+
+
+_SNAPSHOT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+_SNAPSHOT_JSON_COLUMNS_KEY = b"thoth.lab.json_columns"
+_SNAPSHOT_MANIFEST = "manifest.json"
+
+
+def _inspection_df_to_table(df: pd.DataFrame):
+    """Convert inspection pd.DataFrame to pyarrow.Table, columns of nested records are stored as JSON.
+
+    Arrow can't represent heterogeneous records and would turn lists into arrays,
+    JSON keeps the records intact.
+    """
+    import pyarrow as pa
+
+    json_columns = []
+    for col in df.columns[df.dtypes == object]:
+        try:
+            is_nested = pa.types.is_nested(pa.array(df[col], from_pandas=True).type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            is_nested = True
+
+        if is_nested:
+            json_columns.append(col)
+
+    if json_columns:
+        df = df.assign(
+            **{col: df[col].apply(lambda v: json.dumps(v, default=str) if v is not None else v) for col in json_columns}
+        )
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    metadata = {**(table.schema.metadata or {}), _SNAPSHOT_JSON_COLUMNS_KEY: json.dumps(json_columns).encode()}
+
+    return table.replace_schema_metadata(metadata)
+
+
+def _inspection_df_from_table(table) -> pd.DataFrame:
+    """Convert pyarrow.Table created by `_inspection_df_to_table` back to inspection pd.DataFrame."""
+    json_columns = json.loads((table.schema.metadata or {}).get(_SNAPSHOT_JSON_COLUMNS_KEY, b"[]"))
+
+    df = table.to_pandas()
+    for col in json_columns:
+        df[col] = df[col].apply(lambda v: json.loads(v) if isinstance(v, str) else v)
+
+    return df
+
+
+def save_inspection_results_df_dict(
+    inspection_results_df_dict: dict, path: Union[str, Path], *, snapshot_format: str = "parquet"
+) -> List[Path]:
+    """Save processed inspection pd.DataFrame of each inspection identifier as a columnar snapshot.
+
+    Each identifier is stored in a separate file in the `path` directory. Dtypes, timedeltas and MultiIndex
+    are preserved, columns containing nested records which Arrow can't represent are stored JSON-encoded.
+    The order of the identifiers is recorded in a manifest of the snapshot. Requires `pyarrow`.
+
+    :param inspection_results_df_dict: dictionary as returned by `create_inspection_results_df_dict`
+    :param path: directory to store the snapshot in
+    :param snapshot_format: either "parquet" or "arrow" (Arrow IPC file format)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if snapshot_format not in _SNAPSHOT_FORMATS:
+        raise ValueError(f"Unsupported snapshot format: {snapshot_format!r}, expected one of {list(_SNAPSHOT_FORMATS)}")
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    for identifier, df in inspection_results_df_dict.items():
+        table = _inspection_df_to_table(df)
+        file_path = path / f"{identifier}{_SNAPSHOT_FORMATS[snapshot_format]}"
+
+        if snapshot_format == "parquet":
+            pq.write_table(table, str(file_path))
+        else:
+            with pa.OSFile(str(file_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        # identifier previously saved in another format would be ambiguous
+        for suffix in _SNAPSHOT_FORMATS.values():
+            stale_path = path / f"{identifier}{suffix}"
+            if stale_path != file_path and stale_path.exists():
+                stale_path.unlink()
+
+        logger.info(f"Inspection batch {identifier!r} saved to: {file_path}")
+        files.append(file_path)
+
+    # identifiers saved previously to the same snapshot follow the saved identifiers
+    manifest_path = path / _SNAPSHOT_MANIFEST
+    previous_identifiers = json.loads(manifest_path.read_text())["identifiers"] if manifest_path.exists() else []
+
+    identifiers = list(inspection_results_df_dict)
+    identifiers += [identifier for identifier in previous_identifiers if identifier not in inspection_results_df_dict]
+
+    manifest_path.write_text(json.dumps({"identifiers": identifiers}, indent=2))
+
+    return files
+
+
+def load_inspection_results_df_dict(
+    path: Union[str, Path], identifiers: List[str] = None, *, memory_map: bool = True
+) -> dict:
+    """Load processed inspection pd.DataFrames saved by `save_inspection_results_df_dict`.
+
+    :param path: directory containing the snapshot
+    :param identifiers: identifiers to load, all identifiers found in the snapshot are loaded if not provided,
+        in the order they were saved in (identifiers missing in the manifest of the snapshot come last)
+    :param memory_map: memory-map the files instead of reading them into memory first
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+
+    files = {}
+    for snapshot_format, suffix in _SNAPSHOT_FORMATS.items():
+        for file_path in sorted(path.glob(f"*{suffix}")):
+            identifier = file_path.name[: -len(suffix)]
+
+            if identifier in files:
+                raise ValueError(
+                    f"Inspection batch {identifier!r} is stored in multiple formats: {files[identifier][1].name}, "
+                    f"{file_path.name}"
+                )
+
+            files[identifier] = (snapshot_format, file_path)
+
+    if identifiers is None:
+        manifest_path = path / _SNAPSHOT_MANIFEST
+        manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {"identifiers": []}
+
+        saved_identifiers = [identifier for identifier in manifest["identifiers"] if identifier in files]
+        identifiers = saved_identifiers + [identifier for identifier in files if identifier not in saved_identifiers]
+
+    inspection_results_df_dict = {}
+    for identifier in identifiers:
+        snapshot_format, file_path = files[identifier]
+
+        if snapshot_format == "parquet":
+            table = pq.read_table(str(file_path), memory_map=memory_map)
+        else:
+            source = pa.memory_map(str(file_path)) if memory_map else pa.OSFile(str(file_path))
+            with source:
+                table = pa.ipc.open_file(source).read_all()
 
-        df_duration = create_duration_dataframe(df)
-        inspection_results_df_dict[identifier]["job_duration"] = df_duration["job_duration"]
-        inspection_results_df_dict[identifier]["build_duration"] = df_duration["build_duration"]
+        inspection_results_df_dict[identifier] = _inspection_df_from_table(table)
 
     return inspection_results_df_dict
 
@@ -617,50 +1398,296 @@ def create_inspection_batches_parameters_dataframe(
     return df_parameters, batches_parameter_map
 
 
+_STATISTICAL_QUANTITIES = ["cv", "std_error", "std", "median", "q1", "q3", "iqr", "max", "min"]
+
+
 def evaluate_statistics(df_inspection: pd.DataFrame, inspection_parameter: str) -> Dict:
     """Evaluate statistical quantities of a specific parameter of inspection results."""
-    cv = df_inspection[inspection_parameter].std() / df_inspection[inspection_parameter].mean() * 100
-    std_error = df_inspection[inspection_parameter].std() / np.sqrt(df_inspection[inspection_parameter].shape[0])
-    std = df_inspection[inspection_parameter].std()
-    median = df_inspection[inspection_parameter].median()
-    q = df_inspection[inspection_parameter].quantile([0.25, 0.75])
-    q1 = q[0.25]
-    q3 = q[0.75]
-    iqr = q3 - q1
-    maxr = df_inspection[inspection_parameter].max()
-    minr = df_inspection[inspection_parameter].min()
+    parameter = df_inspection[inspection_parameter]
+
+    std = parameter.std()
+    q = parameter.quantile([0.25, 0.5, 0.75])
 
     return {
-        "cv": cv,
-        "std_error": std_error,
+        "cv": std / parameter.mean() * 100,
+        "std_error": std / np.sqrt(parameter.shape[0]),
         "std": std,
-        "median": median,
-        "q1": q1,
-        "q3": q3,
-        "iqr": iqr,
-        "max": maxr,
-        "min": minr,
+        "median": q[0.5],
+        "q1": q[0.25],
+        "q3": q[0.75],
+        "iqr": q[0.75] - q[0.25],
+        "max": parameter.max(),
+        "min": parameter.min(),
     }
 
 
+def evaluate_statistics_summary(
+    df_inspection_batches_dict: dict,
+    inspection_parameters: Union[str, List[str]],
+    list_inspection_identifiers: List[str] = None,
+) -> pd.DataFrame:
+    """Evaluate statistical quantities of inspection parameters for all inspection batches at once.
+
+    The batches are concatenated and described by a single groupby, the statistical quantities
+    are then derived from the description column-wise.
+
+    :param df_inspection_batches_dict: dictionary of inspection DataFrames by inspection identifier
+    :param inspection_parameters: inspection parameter(s) to evaluate the statistics for
+    :param list_inspection_identifiers: inspection identifiers to evaluate, all batches by default
+    :returns: DataFrame indexed by (batch, parameter) with a column per statistical quantity
+    """
+    if isinstance(inspection_parameters, str):
+        inspection_parameters = [inspection_parameters]
+
+    if list_inspection_identifiers is None:
+        list_inspection_identifiers = list(df_inspection_batches_dict)
+
+    df = pd.concat(
+        [df_inspection_batches_dict[identifier][inspection_parameters] for identifier in list_inspection_identifiers],
+        keys=list_inspection_identifiers,
+        names=["batch"],
+    )
+
+    grouped = df.groupby(level="batch", sort=False)
+    description = grouped.describe().stack(level=0)
+    description.index.names = ["batch", "parameter"]
+
+    index = pd.MultiIndex.from_product(
+        [list_inspection_identifiers, inspection_parameters], names=["batch", "parameter"]
+    )
+    description = description.reindex(index)
+
+    # standard error is computed from the number of inspections, including the missing values
+    n_inspections = grouped.size().reindex(description.index.get_level_values("batch")).values
+
+    summary = pd.DataFrame(
+        {
+            "cv": description["std"] / description["mean"] * 100,
+            "std_error": description["std"] / np.sqrt(n_inspections),
+            "std": description["std"],
+            "median": description["50%"],
+            "q1": description["25%"],
+            "q3": description["75%"],
+            "iqr": description["75%"] - description["25%"],
+            "max": description["max"],
+            "min": description["min"],
+        },
+        index=description.index,
+        columns=_STATISTICAL_QUANTITIES,
+    )
+
+    return summary
+
+
+class QuantileSketch(object):
+    """Mergeable KLL quantile sketch of a stream of values.
+
+    Values are kept in a hierarchy of compactors, the compactor at level `h` holds items of weight `2 ** h`.
+    When a compactor exceeds its capacity, its items are sorted and every other item (with a random offset)
+    is promoted to the next level, so the memory stays O(k) regardless of the number of values.
+    The rank error of the estimated quantiles is O(1/k) with high probability, roughly 1.7% of the number
+    of values for the default `k=200`. Count, mean, standard deviation, min and max are tracked exactly.
+
+    Sketches can be updated from separate streams (e.g. batches or worker processes) and merged,
+    the merged sketch keeps the same error bound.
+    """
+
+    def __init__(self, k: int = 200, seed: int = None):
+        """Initialize empty sketch, `k` controls the accuracy and the size of the sketch."""
+        self.k = k
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+        self._compactors: List[List[float]] = [[]]
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        """Return number of values the sketch has been updated with."""
+        return self.count
+
+    @property
+    def std(self) -> float:
+        """Return sample standard deviation of the values."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def update(self, value: float) -> "QuantileSketch":
+        """Update the sketch with a single value, missing values are ignored."""
+        if value is None or np.isnan(value):
+            return self
+
+        value = float(value)
+
+        # Welford's online algorithm
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        self.min = min(self.min, value) if self.count > 1 else value
+        self.max = max(self.max, value) if self.count > 1 else value
+
+        self._compactors[0].append(value)
+        if len(self._compactors[0]) >= self._capacity(0):
+            self._compress()
+
+        return self
+
+    def update_many(self, values: Iterable[float]) -> "QuantileSketch":
+        """Update the sketch with multiple values."""
+        for value in values:
+            self.update(value)
+
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Merge other sketch into this one."""
+        if not other.count:
+            return self
+
+        if not self.count:
+            self.mean, self.m2 = other.mean, other.m2
+        else:
+            # parallel algorithm by Chan et al.
+            count = self.count + other.count
+            delta = other.mean - self.mean
+
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+
+        self.count += other.count
+        self.min = np.nanmin([self.min, other.min])
+        self.max = np.nanmax([self.max, other.max])
+
+        while len(self._compactors) < len(other._compactors):
+            self._compactors.append([])
+
+        for compactor, other_compactor in zip(self._compactors, other._compactors):
+            compactor.extend(other_compactor)
+
+        self._compress()
+
+        return self
+
+    def quantile(self, q: Union[float, List[float]]) -> Union[float, np.ndarray]:
+        """Estimate quantile(s) of the values."""
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+
+        items = np.concatenate([np.asarray(compactor, dtype=float) for compactor in self._compactors])
+        weights = np.concatenate([np.full(len(compactor), 2 ** h) for h, compactor in enumerate(self._compactors)])
+
+        order = np.argsort(items, kind="mergesort")
+        items, cumulative_weights = items[order], np.cumsum(weights[order])
+
+        ranks = np.asarray(q, dtype=float) * cumulative_weights[-1]
+        quantiles = items[np.minimum(np.searchsorted(cumulative_weights, ranks), len(items) - 1)]
+
+        # extremes are known exactly
+        quantiles = np.where(np.asarray(q) <= 0, self.min, np.where(np.asarray(q) >= 1, self.max, quantiles))
+
+        return quantiles if np.ndim(q) else float(quantiles)
+
+    def statistics(self) -> Dict:
+        """Evaluate statistical quantities, the keys match those of `evaluate_statistics`."""
+        q1, median, q3 = self.quantile([0.25, 0.5, 0.75])
+
+        return {
+            "cv": self.std / self.mean * 100 if self.count else np.nan,
+            "std_error": self.std / np.sqrt(self.count) if self.count else np.nan,
+            "std": self.std,
+            "median": median,
+            "q1": q1,
+            "q3": q3,
+            "iqr": q3 - q1,
+            "max": self.max,
+            "min": self.min,
+        }
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self._compactors) - h - 1
+
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        for h in range(len(self._compactors)):
+            compactor = self._compactors[h]
+            if len(compactor) < self._capacity(h):
+                continue
+
+            if h + 1 == len(self._compactors):
+                self._compactors.append([])
+
+            compactor.sort()
+            # odd item stays in the compactor
+            leftover = [compactor.pop()] if len(compactor) % 2 else []
+
+            offset = self._random.randint(0, 1)
+            self._compactors[h + 1].extend(compactor[offset::2])
+            self._compactors[h] = leftover
+
+
+class InspectionDurationStatistics(object):
+    """Streaming statistics of job and build durations of inspections.
+
+    The accumulator is updated directly from inspection documents as they are retrieved (see
+    `iter_inspection_results`), so no DataFrame has to be kept in memory. Accumulators of different
+    batches or worker processes can be merged.
+    """
+
+    STAGES = ("job", "build")
+
+    def __init__(self, k: int = 200, seed: int = None):
+        """Initialize empty sketches for each inspection stage."""
+        self.sketches: Dict[str, QuantileSketch] = {
+            f"{stage}_duration": QuantileSketch(k=k, seed=seed) for stage in self.STAGES
+        }
+
+    def update(self, document: dict) -> "InspectionDurationStatistics":
+        """Update statistics from the status of an inspection document."""
+        status = document.get("status") or {}
+
+        for stage in self.STAGES:
+            stage_status = status.get(stage) or {}
+            started_at, finished_at = stage_status.get("started_at"), stage_status.get("finished_at")
+
+            if started_at and finished_at:
+                duration = (pd.Timestamp(finished_at) - pd.Timestamp(started_at)).total_seconds()
+                self.sketches[f"{stage}_duration"].update(duration)
+
+        return self
+
+    def update_many(self, documents: Iterable[dict]) -> "InspectionDurationStatistics":
+        """Update statistics from multiple inspection documents."""
+        for document in documents:
+            self.update(document)
+
+        return self
+
+    def merge(self, other: "InspectionDurationStatistics") -> "InspectionDurationStatistics":
+        """Merge statistics of other accumulator into this one."""
+        for key, sketch in other.sketches.items():
+            self.sketches[key].merge(sketch)
+
+        return self
+
+    def statistics(self) -> Dict[str, Dict]:
+        """Evaluate statistical quantities of the durations in seconds by duration parameter."""
+        return {key: sketch.statistics() for key, sketch in self.sketches.items()}
+
+
 def evaluate_inspection_statistics_result_dict(
     df_inspection_batches_dict: dict, list_inspection_identifiers: List[str], inspection_parameter: str
 ) -> dict:
     """Aggregate statistical quantities per inspection parameter for inspection batches."""
-    evaluated_statistics = {}
-    for identifier in list_inspection_identifiers:
-        evaluated_statistics[identifier] = evaluate_statistics(
-            df_inspection=df_inspection_batches_dict[identifier], inspection_parameter=inspection_parameter
-        )
-
-    aggregated_statistics = {}
-
-    for statistical_quantity in evaluated_statistics[identifier].keys():
-        aggregated_statistics[statistical_quantity] = [
-            values[statistical_quantity] for values in evaluated_statistics.values()
-        ]
+    summary = evaluate_statistics_summary(
+        df_inspection_batches_dict, [inspection_parameter], list_inspection_identifiers
+    ).xs(inspection_parameter, level="parameter")
 
-    return aggregated_statistics
+    return {statistical_quantity: summary[statistical_quantity].tolist() for statistical_quantity in summary.columns}
 
 
 def plot_interpolated_statistics_of_inspection_parameters(
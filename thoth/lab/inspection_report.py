@@ -16,13 +16,22 @@
 
 """Inspection report generation and visualization."""
 
+import collections
+import hashlib
 import logging
+import pickle
 import re
 
+import numpy as np
 import pandas as pd
 
 from typing import Any, Dict, List, Tuple, Union
+from typing import Iterator, Optional
+from pathlib import Path
 from thoth.lab import inspection
+from thoth.lab import underscore
+from thoth.lab.utils import NestedValueHasher
+from thoth.lab.utils import hash_nested_value
 
 logger = logging.getLogger("thoth.lab.inspection_report")
 
@@ -51,8 +60,26 @@ _INSPECTION_JSON_DF_KEYS_FEATURES_MAPPING = {
 }
 
 
-def create_report(df_inspection_batch: pd.DataFrame) -> dict:
-    """Create report describing the batch of inspection jobs for the different features."""
+def create_report(df_inspection_batch: pd.DataFrame, engine: str = "codes", hash_nested: bool = False) -> dict:
+    """Create report describing the batch of inspection jobs for the different features.
+
+    :param df_inspection_batch: inspection DataFrame of a single batch
+    :param engine: engine used to compute the categories, one of:
+
+        - "codes": every mapped column is factorized once and the categories of all features are computed
+          from the shared codes (default)
+        - "query": each feature is grouped by `inspection.query_inspection_dataframe` separately
+
+    :param hash_nested: whether to report categories of columns with nested values (lists, dicts, ...),
+        which are otherwise dropped, the values are grouped by their digests, see `utils.NestedValueHasher`
+    """
+    if engine not in ("codes", "query"):
+        raise ValueError(f"Unknown report engine: {engine!r}")
+
+    column_codes = {}
+    # original values are recorded only for the time of the report creation
+    hasher = NestedValueHasher() if hash_nested else None
+
     report_results = {}
     for feature, sub_features in _INSPECTION_REPORT_FEATURES.items():
         report_results[feature] = {}
@@ -64,159 +91,390 @@ def create_report(df_inspection_batch: pd.DataFrame) -> dict:
                 logger.info("-------------------------------------------------------------------------")
                 logger.info(f"{feature} -> {sub_feature}")
                 logger.info("-------------------------------------------------------------------------")
-                sub_feature_result = inspection.query_inspection_dataframe(
-                    df_inspection_batch, groupby=_INSPECTION_JSON_DF_KEYS_FEATURES_MAPPING[sub_feature], exclude="node"
-                )
-                report_results[feature][sub_feature] = inspection.show_categories(sub_feature_result)
+                groupby = _INSPECTION_JSON_DF_KEYS_FEATURES_MAPPING[sub_feature]
+                if engine == "codes":
+                    report_results[feature][sub_feature] = _show_categories_from_codes(
+                        df_inspection_batch, groupby, column_codes, hasher=hasher
+                    )
+                else:
+                    sub_feature_result = inspection.query_inspection_dataframe(
+                        df_inspection_batch, groupby=groupby, exclude="node", hash_nested=hasher or False
+                    )
+                    report_results[feature][sub_feature] = inspection.show_categories(
+                        sub_feature_result, restore_nested=hasher or False
+                    )
         else:
-            feature_result = inspection.query_inspection_dataframe(
-                df_inspection_batch, groupby=_INSPECTION_JSON_DF_KEYS_FEATURES_MAPPING[feature], exclude="node"
-            )
-            report_results[feature] = inspection.show_categories(feature_result)
+            groupby = _INSPECTION_JSON_DF_KEYS_FEATURES_MAPPING[feature]
+            if engine == "codes":
+                report_results[feature] = _show_categories_from_codes(
+                    df_inspection_batch, groupby, column_codes, hasher=hasher
+                )
+            else:
+                feature_result = inspection.query_inspection_dataframe(
+                    df_inspection_batch, groupby=groupby, exclude="node", hash_nested=hasher or False
+                )
+                report_results[feature] = inspection.show_categories(feature_result, restore_nested=hasher or False)
 
     return report_results
 
 
-def create_tot_report_dict(identifier_inspection: List[str], inspection_results_df_dict: dict) -> dict:
-    """Create dictionary containing all reports for inspection batches selected."""
+def _factorize_column(column: pd.Series, hasher: NestedValueHasher = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Factorize column so that the order of codes follows the order of sorted values if possible.
+
+    :param hasher: hasher to factorize nested values by their digests with, unique values are restored
+    """
+    if hasher is not None and hasher.is_nested(column):
+        codes, uniques = pd.factorize(hasher.hash_series(column), sort=True)
+
+        return codes, [hasher.restore(digest) for digest in uniques]
+
+    try:
+        return pd.factorize(column, sort=True)
+    except TypeError:
+        # values which can not be compared are kept in order of appearance
+        return pd.factorize(column)
+
+
+def _show_categories_from_codes(
+    df_inspection_batch: pd.DataFrame,
+    groupby: List[str],
+    column_codes: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    hasher: NestedValueHasher = None,
+) -> dict:
+    """List categories of the batch grouped by `groupby` columns, same as `inspection.show_categories` does.
+
+    :param column_codes: codes and unique values of the columns factorized so far, shared between features
+
+    Rows with a missing value in any of the columns do not belong to any category:
+
+    >>> _show_categories_from_codes(pd.DataFrame({"name": ["a", None], "name_b": [None, "b"]}), ["name"], {})
+    {}
+    """
+    columns = []
+    for col in df_inspection_batch._._get_group_columns(groupby, exclude="node"):
+        if col not in column_codes:
+            try:
+                column_codes[col] = _factorize_column(df_inspection_batch[col], hasher=hasher)
+            except TypeError:
+                logger.warning(f"Column '{col!s}' dtype NOT understood. Dropped")
+                column_codes[col] = None
+
+        if column_codes[col] is None:
+            continue
+
+        if not (column_codes[col][0] >= 0).any():
+            logger.warning(f"Column '{col!s}' could NOT be used as index group. Dropped.")
+            continue
+
+        columns.append(col)
+
+    if not columns:
+        return {}
+
+    codes = np.column_stack([column_codes[col][0] for col in columns])
+    # rows with missing values do not belong to any category
+    codes = codes[(codes >= 0).all(axis=1)]
+    if not len(codes):
+        return {}
+
+    # unique rows are sorted lexicographically, which is the order of sorted index of the grouped DataFrame
+    categories, counts = np.unique(codes, axis=0, return_counts=True)
+
+    results_categories = {}
+    for n, (category, count) in enumerate(zip(categories, counts)):
+        logger.debug(f"\nClass {n + 1}/{len(categories)}")
+
+        class_results = {}
+        for col, code in zip(columns, category):
+            value = column_codes[col][1][code]
+            logger.debug(f"{col} : {value}")
+            class_results[col] = value
+        results_categories[n + 1] = class_results
+
+        logger.debug(f"Number of rows (jobs) is: {count}")
+
+    return results_categories
+
+
+def create_tot_report_dict(identifier_inspection: List[str], inspection_results_df_dict: dict, **kwargs) -> dict:
+    """Create dictionary containing all reports for inspection batches selected.
+
+    :param kwargs: additional parameters passed to `create_report`
+    """
     inspection_batches_reports_dict = {}
 
     for identifier in identifier_inspection:
-        inspection_batches_reports_dict[identifier] = create_report(inspection_results_df_dict[identifier])
+        inspection_batches_reports_dict[identifier] = create_report(inspection_results_df_dict[identifier], **kwargs)
 
     return inspection_batches_reports_dict
 
 
-def create_feature_summary(inspection_batches_reports_dict: dict, explanation: bool = False) -> dict:
-    """Create summary of number of combinations per features."""
-    results_features = _aggregate_results_per_feature(inspection_batches_reports_dict)
-    features_summary = {}
-    if explanation:
-        explanation_summary = {}
-    for feature, feature_results in results_features.items():
-        if explanation:
-            explanation_summary[feature] = {}
-
-        if not isinstance(feature_results, list):
-            features_summary[feature] = {}
-
-            for sub_feature, sub_feature_results in feature_results.items():
-                if explanation:
-                    explanation_summary[feature][sub_feature] = {}
-                keys = [key for key in sub_feature_results[0].keys()]
-                key_counts = {}
-
-                for key in keys:
-
-                    key_counts[key] = len(set([k[key] for k in results_features[feature][sub_feature]]))
-                    if explanation:
-                        if key_counts[key] != 1:
-                            explanation_summary[feature][sub_feature][key] = set(
-                                [k[key] for k in results_features[feature][sub_feature]]
-                            )
-
-                features_summary[feature][sub_feature] = key_counts
+class InspectionReportIndex(object):
+    """Inverted index of inspection batch reports.
+
+    Each (feature, sub_feature, key, value) found in the reports, as created by `create_report`, is mapped
+    to the set of batch identifiers it appears in. Features without sub-features are indexed
+    with `sub_feature` set to None. Nested values (see `hash_nested` parameter of `create_report`)
+    are indexed by their digests.
+    """
+
+    def __init__(self, inspection_batches_reports_dict: dict = None):
+        """Initialize index, optionally from reports of inspection batches as created by `create_tot_report_dict`."""
+        self._index: Dict[tuple, set] = {}
+        self._batches: Dict[str, set] = {}
+        # original nested values of the items indexed by digests, kept with the index so that it can be pickled
+        self._nested_items: Dict[tuple, Any] = {}
+
+        for batch, report in (inspection_batches_reports_dict or {}).items():
+            self.add(batch, report)
+
+    def __contains__(self, batch: str) -> bool:
+        """Check whether the batch is indexed."""
+        return batch in self._batches
+
+    def __getitem__(self, item: tuple) -> set:
+        """Get batches given (feature, sub_feature, key, value)."""
+        return self._index.get(self._get_item(*item), set())
+
+    def __len__(self) -> int:
+        """Return number of indexed batches."""
+        return len(self._batches)
+
+    @property
+    def batches(self) -> List[str]:
+        """Return indexed batch identifiers in order of insertion."""
+        return list(self._batches)
+
+    def add(self, batch: str, report: dict):
+        """Add report of the batch to the index, previously indexed report of the batch is replaced."""
+        if batch in self._batches:
+            self.remove(batch)
+
+        items = self._batches[batch] = set()
+        for (feature, sub_feature), categories in _iter_report_categories(report):
+            for category in categories.values():
+                for key, value in category.items():
+                    item = self._get_item(feature, sub_feature, key, value)
+                    if item[-1] is not value:
+                        self._nested_items[item] = value
+
+                    self._index.setdefault(item, set()).add(batch)
+                    items.add(item)
+
+    def remove(self, batch: str):
+        """Remove report of the batch from the index."""
+        for item in self._batches.pop(batch):
+            batches = self._index[item]
+            batches.discard(batch)
+
+            if not batches:
+                del self._index[item]
+                self._nested_items.pop(item, None)
+
+    def summary(self) -> pd.DataFrame:
+        """Get number of distinct values per feature key across all indexed batches."""
+        counts = collections.Counter((feature, sub_feature, key) for feature, sub_feature, key, _ in self._index)
+
+        return pd.DataFrame(
+            [(*item, count) for item, count in counts.items()], columns=["feature", "sub_feature", "key", "count"]
+        )
+
+    def differences(self) -> pd.DataFrame:
+        """Get values of feature keys which differ across the indexed batches together with the batches."""
+        counts = collections.Counter((feature, sub_feature, key) for feature, sub_feature, key, _ in self._index)
+        order = {batch: n for n, batch in enumerate(self._batches)}
+
+        differences = [
+            (*item[:-1], self._get_value(item), sorted(batches, key=order.get))
+            for item, batches in self._index.items()
+            if counts[item[:-1]] > 1
+        ]
+
+        return pd.DataFrame(differences, columns=["feature", "sub_feature", "key", "value", "batches"])
+
+    def _get_item(self, feature: str, sub_feature: Optional[str], key: str, value: Any) -> tuple:
+        try:
+            hash(value)
+        except TypeError:
+            value = hash_nested_value(value)
+
+        return feature, sub_feature, key, value
+
+    def _get_value(self, item: tuple) -> Any:
+        return self._nested_items.get(item, item[-1])
+
+
+def _iter_report_categories(report: dict) -> Iterator[Tuple[Tuple[str, Optional[str]], dict]]:
+    """Iterate over categories of the report by (feature, sub_feature)."""
+    for feature, sub_features in _INSPECTION_REPORT_FEATURES.items():
+        if sub_features:
+            for sub_feature in sub_features:
+                yield (feature, sub_feature), report[feature][sub_feature]
         else:
-            keys = [key for key in feature_results[0].keys()]
-            key_counts = {}
+            yield (feature, None), report[feature]
+
 
-            for key in keys:
-                key_counts[key] = len(set([k[key] for k in results_features[feature]]))
-                if explanation:
-                    if key_counts[key] != 1:
-                        explanation_summary[feature][key] = set([k[key] for k in results_features[feature]])
+def create_feature_summary(inspection_batches_reports_dict: dict, explanation: bool = False) -> pd.DataFrame:
+    """Create summary of number of combinations per features.
+
+    :param inspection_batches_reports_dict: reports of inspection batches as created by `create_tot_report_dict`
+        or an already built `InspectionReportIndex`
+    :param explanation: whether to explain the differences with values and batches they appear in
+    :returns: number of distinct values per feature key, or values of the differing feature keys
+        together with the batches if `explanation` is set
+    """
+    if isinstance(inspection_batches_reports_dict, InspectionReportIndex):
+        index = inspection_batches_reports_dict
+    else:
+        index = InspectionReportIndex(inspection_batches_reports_dict)
 
-            features_summary[feature] = key_counts
     if explanation:
-        return _visualize_differences_in_inspection_results(explanation_summary, inspection_batches_reports_dict)
+        differences = index.differences()
+        _visualize_differences_in_inspection_results(differences)
 
-    return _visualize_summary(features_summary)
+        return differences
 
+    summary = index.summary()
+    _visualize_summary(summary)
 
-def _aggregate_results_per_feature(inspection_batches_reports_dict: dict) -> dict:
-    """Aggregate results for all features across all batches."""
-    results_per_feature_per_batch = {}
+    return summary
 
-    for feature, sub_features in _INSPECTION_REPORT_FEATURES.items():
-        for batch in inspection_batches_reports_dict.keys():
 
-            if sub_features:
-                if feature not in results_per_feature_per_batch.keys():
-                    results_per_feature_per_batch[feature] = {}
+class InspectionReportStore(object):
+    """Incrementally updated store of inspection batch reports.
 
-                for sub_feature in sub_features:
+    Report of each batch is cached together with a fingerprint of the batch DataFrame, reports are
+    created only for new batches or batches whose DataFrame has changed since the last update.
+    The `InspectionReportIndex` of the reports is updated in place, so that feature summaries
+    do not have to be rebuilt from all the reports.
+    """
 
-                    if sub_feature not in results_per_feature_per_batch[feature].keys():
-                        results_per_feature_per_batch[feature][sub_feature] = []
+    def __init__(self, **kwargs):
+        """Initialize empty store.
 
-                    for k, v in inspection_batches_reports_dict[batch][feature][sub_feature].items():
-                        results_per_feature_per_batch[feature][sub_feature].append(
-                            inspection_batches_reports_dict[batch][feature][sub_feature][k]
-                        )
-            else:
+        :param kwargs: additional parameters passed to `create_report`
+        """
+        self.report_kwargs = kwargs
+
+        self.reports: Dict[str, dict] = {}
+        self.index = InspectionReportIndex()
+
+        self._fingerprints: Dict[str, str] = {}
+
+    def __contains__(self, identifier: str) -> bool:
+        """Check whether report of the batch is stored."""
+        return identifier in self.reports
+
+    def __len__(self) -> int:
+        """Return number of stored reports."""
+        return len(self.reports)
+
+    @staticmethod
+    def fingerprint(df_inspection_batch: pd.DataFrame) -> str:
+        """Compute fingerprint of the batch DataFrame from its columns, index and values."""
+        try:
+            hashed = pd.util.hash_pandas_object(df_inspection_batch, index=True).values
+        except TypeError:
+            # nested values (lists, dicts) are not hashable
+            hashed = pd.util.hash_pandas_object(df_inspection_batch.astype(str), index=True).values
 
-                if feature not in results_per_feature_per_batch.keys():
-                    results_per_feature_per_batch[feature] = []
+        digest = hashlib.sha256(hashed.tobytes())
+        digest.update(repr(df_inspection_batch.columns.tolist()).encode("utf-8"))
 
-                for k, v in inspection_batches_reports_dict[batch][feature].items():
-                    results_per_feature_per_batch[feature].append(inspection_batches_reports_dict[batch][feature][k])
+        return digest.hexdigest()
 
-    return results_per_feature_per_batch
+    def update(self, inspection_results_df_dict: dict, identifier_inspection: List[str] = None) -> List[str]:
+        """Update reports of new or changed inspection batches.
 
+        :param inspection_results_df_dict: dictionary of inspection DataFrames by inspection identifier
+        :param identifier_inspection: inspection identifiers to update, all batches by default
+        :returns: identifiers of the batches whose reports have been (re)created
+        """
+        if identifier_inspection is None:
+            identifier_inspection = list(inspection_results_df_dict)
 
-def _visualize_summary(summary_results: dict):
+        updated = []
+        for identifier in identifier_inspection:
+            df_inspection_batch = inspection_results_df_dict[identifier]
+
+            fingerprint = self.fingerprint(df_inspection_batch)
+            if self._fingerprints.get(identifier) == fingerprint:
+                logger.debug(f"Report of inspection batch {identifier!r} is up to date")
+                continue
+
+            report = create_report(df_inspection_batch, **self.report_kwargs)
+
+            self.reports[identifier] = report
+            self.index.add(identifier, report)
+            self._fingerprints[identifier] = fingerprint
+
+            updated.append(identifier)
+
+        logger.info(f"Updated {len(updated)} of {len(identifier_inspection)} inspection batch reports")
+
+        return updated
+
+    def remove(self, identifier: str):
+        """Remove report of the batch from the store."""
+        del self.reports[identifier]
+        del self._fingerprints[identifier]
+
+        self.index.remove(identifier)
+
+    def summary(self, explanation: bool = False) -> pd.DataFrame:
+        """Create summary of number of combinations per features of the stored reports, see `create_feature_summary`."""
+        return create_feature_summary(self.index, explanation=explanation)
+
+    def save(self, path: Union[str, Path]):
+        """Save the store to the given path."""
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "InspectionReportStore":
+        """Load the store from the given path."""
+        with open(path, "rb") as f:
+            store = pickle.load(f)
+
+        if not isinstance(store, cls):
+            raise TypeError(f"Expected {cls.__name__!r}, got {type(store).__name__!r}")
+
+        return store
+
+
+def _visualize_summary(summary_results: pd.DataFrame):
     """Visualize summary of results for all inspection batches (if there are any differences)."""
-    for feature, feature_results in summary_results.items():
+    for feature, feature_results in summary_results.groupby("feature", sort=False):
+        differing = feature_results[feature_results["count"] > 1]
+        if differing.empty:
+            continue
+
         logger.info("===============================================================================")
         logger.info(feature)
         logger.info("===============================================================================")
-        if len(feature_results) > 1:
-            for sub_feature, sub_feature_results in feature_results.items():
+        for sub_feature, sub_feature_results in differing.groupby(differing["sub_feature"].fillna(""), sort=False):
+            if sub_feature:
                 logger.info("---------------------------------------------------------------------------")
                 logger.info(sub_feature)
-                for key, count in sub_feature_results.items():
-                    if count > 1:
-                        logger.info(f"{key}: {count}")
 
-        else:
-            for key, count in feature_results.items():
-                if count > 1:
-                    logger.info(
-                        "==========================================================================================="
-                    )
-                    logger.info(feature)
-                    logger.info(
-                        "==========================================================================================="
-                    )
-                    logger.info(f"{key}: {count}")
+            for key, count in zip(sub_feature_results["key"], sub_feature_results["count"]):
+                logger.info(f"{key}: {count}")
 
 
-def _visualize_differences_in_inspection_results(summary_explained: dict, dict_all_reports: dict):
-    """Function to identify and visualize differences in inspection batches for the different features."""
-    for feature, feature_results in summary_explained.items():
+def _visualize_differences_in_inspection_results(summary_explained: pd.DataFrame):
+    """Visualize differences in inspection batches for the different features."""
+    for feature, feature_results in summary_explained.groupby("feature", sort=False):
         logger.info("=========================================================================")
         logger.info(feature)
         logger.info("=========================================================================")
-        if summary_explained[feature]:
-            for sub_feature, sub_feature_results in feature_results.items():
-                if sub_feature_results:
-                    logger.info("-------------------------------------------------")
-                    logger.info(sub_feature)
-                    logger.info("-------------------------------------------------")
-                    for key_sf in sub_feature_results.keys():
-                        for value in sub_feature_results[key_sf]:
-                            logger.info(f"{key_sf}: {value}")
-                            for batch, batch_results in dict_all_reports.items():
-                                for b, r in batch_results[feature][sub_feature].items():
-                                    if r[key_sf] == value:
-                                        logger.info("Identifier %r:", batch)
-        else:
-            if feature_results:
-                for key_f in feature_results.keys():
-                    for value in sub_feature_results[key_f]:
-                        logger.info("=========================================================================")
-                        logger.info(f"{key_f}: {value}")
-                        for batch, batch_results in tot_reports.items():
-                            for b, r in batch_results[feature].items():
-                                if r[key_f] == value:
-                                    logger.info("Identifier %r:", batch)
+        grouped = feature_results.groupby(feature_results["sub_feature"].fillna(""), sort=False)
+        for sub_feature, sub_feature_results in grouped:
+            if sub_feature:
+                logger.info("-------------------------------------------------")
+                logger.info(sub_feature)
+                logger.info("-------------------------------------------------")
+
+            for key, value, batches in sub_feature_results[["key", "value", "batches"]].values:
+                logger.info(f"{key}: {value}")
+                for batch in batches:
+                    logger.info("Identifier %r:", batch)
@@ -26,12 +26,47 @@ import pandas as pd
 from pandas import api
 
 from thoth.lab.utils import DEFAULT
+from thoth.lab.utils import CompiledPathTrie
+from thoth.lab.utils import compile_path
+from thoth.lab.utils import NestedValueHasher
+from thoth.lab.utils import nested_value_hasher
 from thoth.lab.utils import resolve_query
 from thoth.lab.utils import rget
 
 logger = logging.getLogger("thoth.lab.underscore")
 
 
+def _prepare_record_paths(
+    record_paths: typing.Union[str, list, dict], columns: list = None, default: typing.Union[str, dict] = None
+) -> typing.Tuple[dict, dict]:
+    """Map record paths to column names and defaults."""
+    if isinstance(record_paths, str):
+        record_paths = {record_paths: record_paths}
+
+    elif isinstance(record_paths, (list, set, tuple)):
+        record_paths = {key: key for key in record_paths}
+
+    elif not isinstance(record_paths, typing.Mapping):
+        raise TypeError("`record_paths` expected to be of type Union[list, dict], " f"got: {type(record_paths)}")
+
+    if default is None or isinstance(default, str):
+        default = {key: default for key in record_paths}
+
+    elif not isinstance(default, dict):
+        raise TypeError("`default` expected to be of type Union[str, dict], " f"got: {type(default)}")
+
+    if columns:
+        if len(record_paths) != len(columns):
+            raise ValueError(
+                "Length of `columns` does not match length of `record_paths`: {} != {}".format(
+                    len(columns), len(record_paths)
+                )
+            )
+        record_paths = {key: col_name for key, col_name in zip(record_paths, columns)}
+
+    return record_paths, default
+
+
 @pd.api.extensions.register_dataframe_accessor("_")
 class _Underscore(object):
     def __init__(self, df: pd.DataFrame):
@@ -67,28 +102,59 @@ class _Underscore(object):
         contains lists, they will be flatten into rows.
 
         A column can not contain combination of lists and dictionaries.
+
+        The column is validated, record paths are discovered and records are extracted in a single pass.
+        If `inplace`, the flattened columns are added to the DataFrame itself without copying it.
         """
-        record_paths = record_paths or set()
+        values = self._df[col].values
+
         gather_record_paths = not record_paths
+        if gather_record_paths:
+            records = {}
+        else:
+            record_paths, default = _prepare_record_paths(record_paths, columns=columns, default=default)
+
+            trie = CompiledPathTrie(record_paths)
+            defaults = [default[key] for key in record_paths]
+            cols = list(record_paths.values())
+
+            records = {c: [None] * len(values) for c in cols}
 
-        # validate
+        # validate, discover record paths and extract records in a single pass
         dtype = None
-        for _, entry in self._df[col].iteritems():
+        is_mapping = False
+        for idx, entry in enumerate(values):
             entry_type = type(entry)
 
-            if pd.isna(dtype):
+            if dtype is None:
                 dtype = entry_type
+                is_mapping = issubclass(dtype, typing.Mapping)
             elif entry_type is not dtype:
                 raise TypeError(f"Multiple types found in column '{col}': {[dtype, entry_type]}")
 
-            if gather_record_paths and dtype is dict:
-                record_paths.update(entry.keys())
+            if not is_mapping:
+                continue
+
+            if gather_record_paths:
+                for key in entry.keys():
+                    if key not in records:
+                        records[key] = [None] * len(values)
+
+                    key_default = default.get(key) if isinstance(default, dict) else default
+                    records[key][idx] = compile_path(key).get(entry, default=key_default)
+            else:
+                for c, value in zip(cols, trie.get(entry, defaults)):
+                    records[c][idx] = value
 
         if dtype is None:
             return self._df
 
-        if issubclass(dtype, typing.Mapping):
-            df_flat = self._df[col]._.flatten(record_paths, columns=columns, **kwargs)
+        if is_mapping:
+            if gather_record_paths and columns:
+                record_paths, _ = _prepare_record_paths(list(records), columns=columns)
+                records = {record_paths[key]: records[key] for key in record_paths}
+
+            df_flat = pd.DataFrame(records, index=self._df.index, columns=list(records), **kwargs)
 
         elif issubclass(dtype, (list, set, tuple)):
             stacked: pd.Series = self._df[col]._.vstack()
@@ -97,12 +163,14 @@ class _Underscore(object):
         else:
             raise TypeError(f"Unsupported data type: {dtype}")
 
-        df = pd.concat([self._df, df_flat], axis=1)
-
         if inplace:
-            self._df = df
+            # add the columns to the frame without copying it
+            for c in df_flat.columns:
+                self._df[c] = df_flat[c]
 
-        return df
+            return self._df
+
+        return pd.concat([self._df, df_flat], axis=1)
 
     def hstack(self, columns: typing.Union[str, list]) -> pd.DataFrame:
         """Stack columns containing list of records horizontally."""
@@ -132,20 +200,40 @@ class _Underscore(object):
 
         return df
 
-    def str_join(self, cols: typing.List[str] = None, *, sep: str = "") -> pd.DataFrame:
-        """Combine two or more columns into one joining them with separator."""
+    def str_join(self, cols: typing.List[str] = None, *, sep: str = "", categorical: bool = False) -> pd.Series:
+        """Combine two or more columns into one joining them with separator.
+
+        Missing values are skipped, the columns are joined column-wise.
+
+        :param categorical: return the joined values as categorical, i.e. to be used as grouping key
+        """
         cols = cols or self._df.columns
 
         if len(cols) < 2 or not all(isinstance(col, str) for col in cols):
             raise ValueError("Number of columns must be list of strings of length >= 2.")
 
-        def stringify(s):
-            return str(s) if not pd.isna(s) else None
+        joined = np.full(len(self._df), None, dtype=object)
+        is_empty = np.ones(len(self._df), dtype=bool)
 
-        def safe_join(str_row: list):
-            return sep.join([col for col in str_row if stringify(col) is not None])
+        for col in cols:
+            values = self._df[col]
+            is_valid = values.notna().values
 
-        return self._df[cols].apply(lambda r: safe_join(r), axis=1)
+            strings = values.astype(str).values.astype(object)
+
+            first = is_valid & is_empty
+            rest = is_valid & ~is_empty
+
+            joined[first] = strings[first]
+            joined[rest] = joined[rest] + sep + strings[rest]
+
+            is_empty &= ~is_valid
+
+        joined[is_empty] = ""
+
+        result = pd.Series(joined, index=self._df.index)
+
+        return result.astype("category") if categorical else result
 
     def groupby(
         self,
@@ -153,66 +241,51 @@ class _Underscore(object):
         exclude: typing.Union[str, list, set] = None,
         as_group: bool = False,
         as_index: bool = False,
+        hash_nested: typing.Union[bool, NestedValueHasher] = False,
         **kwargs,
     ) -> typing.Any:
-        """Group DataFrame columns given column sub-strings and optionally create MultiIndex."""
-        groupby = groupby or []
-        exclude = exclude or []
-
-        if isinstance(groupby, str):
-            groupby = [groupby]
-
-        if isinstance(exclude, str):
-            exclude = [exclude]
-
-        groups = []
-
-        for key in groupby:
-            columns_idx = self._df.columns.str.contains(key)
-            columns = self._df.columns[columns_idx]
+        """Group DataFrame columns given column sub-strings and optionally create MultiIndex.
 
-            if not len(columns):
-                raise KeyError(f"Could NOT find suitable column given the keys: `{groupby}`")
-
-            groups.extend(columns)
+        :param hash_nested: whether to group columns of nested values (lists, dicts, ...) by their digests
+            instead of dropping them, see `utils.NestedValueHasher`, the digests are part of the index,
+            original values are recorded by the given hasher or by `utils.nested_value_hasher` if set to True
+        """
+        df = self._df
+        group_columns = self._get_group_columns(groupby, exclude)
 
-        index_groups = []
+        if hash_nested:
+            hasher = hash_nested if isinstance(hash_nested, NestedValueHasher) else nested_value_hasher
 
-        for col in self._df[groups].columns:
-            # check that the column name is not excluded
-            if any(re.search(e, col) for e in exclude):
-                continue
+            nested_columns = [col for col in group_columns if hasher.is_nested(df[col])]
+            if nested_columns:
+                df = df.assign(**{col: hasher.hash_series(df[col]) for col in nested_columns})
 
-            if self._is_valid_group(self._df, col):
-                index_groups.append(col)
+        index_groups = [col for col in group_columns if self._is_valid_group(df, col)]
 
-        index_groups = pd.Series(index_groups).unique().tolist()
+        # categorical columns (see `inspection.compact_inspection_dataframe`) must not create unobserved groups
+        kwargs.setdefault("observed", True)
 
         # construct multi-index if grouping is requested
-        group = self._df.groupby(index_groups, sort=False, **kwargs)
+        group = df.groupby(index_groups, sort=False, **kwargs)
 
         if as_group:
             return group
 
-        indices = group.indices
+        # order rows by group codes, rows within a group keep their original order
+        group_codes = group.ngroup()
+        is_grouped = (group_codes.notna() & (group_codes >= 0)).values
 
-        levels = []
-        for level, values in indices.items():
-            if isinstance(level, tuple):
-                levels.extend([(*level, v) for v in values])
-            else:
-                levels.extend([(level, v) for v in values])
+        positions = np.flatnonzero(is_grouped)
+        positions = positions[np.argsort(group_codes.values[is_grouped], kind="mergesort")]
 
-        index = pd.MultiIndex.from_tuples(levels, names=[*index_groups, None])
+        index = pd.MultiIndex.from_arrays(
+            [*(df[col].values[positions] for col in index_groups), positions], names=[*index_groups, None]
+        )
 
         if as_index:
             return index
 
-        return (
-            self._df.iloc[[idx[-1] for idx in levels]]
-            .set_index(index, drop=True, verify_integrity=True)
-            .drop(index_groups, axis=1)
-        )
+        return df.iloc[positions].set_index(index, drop=True, verify_integrity=True).drop(index_groups, axis=1)
 
     def query(
         self,
@@ -263,13 +336,44 @@ class _Underscore(object):
 
             return df.sort_index(level=levels)
 
+    def _get_group_columns(
+        self, groupby: typing.Union[str, list, set] = None, exclude: typing.Union[str, list, set] = None
+    ) -> typing.List[str]:
+        """Get unique columns matching the `groupby` sub-strings which are not excluded by `exclude` patterns."""
+        groupby = groupby or []
+        exclude = exclude or []
+
+        if isinstance(groupby, str):
+            groupby = [groupby]
+
+        if isinstance(exclude, str):
+            exclude = [exclude]
+
+        groups = []
+
+        for key in groupby:
+            columns_idx = self._df.columns.str.contains(key)
+            columns = self._df.columns[columns_idx]
+
+            if not len(columns):
+                raise KeyError(f"Could NOT find suitable column given the keys: `{groupby}`")
+
+            groups.extend(columns)
+
+        # check that the column name is not excluded
+        groups = [col for col in self._df[groups].columns if not any(re.search(e, col) for e in exclude)]
+
+        return pd.Series(groups).unique().tolist()
+
     @staticmethod
     def _is_valid_group(df: pd.DataFrame, groupby: typing.Union[str, typing.List[str]]) -> bool:
         """Check whether a group is valid for grouping and indexing."""
+        columns = [groupby] if isinstance(groupby, str) else groupby
+
         is_valid = False
         try:
-            # check that grouping is possible
-            is_valid = len(df.groupby(groupby).indices) >= 1
+            # check that the values are hashable and that there is at least one group
+            is_valid = all((pd.factorize(df[col])[0] >= 0).any() for col in columns)
             if not is_valid:
                 logger.warning(f"Column '{groupby!s}' could NOT be used as index group. Dropped.")
 
@@ -297,43 +401,39 @@ class _Underscore(object):
         *,
         columns: list = None,
         default: typing.Union[str, dict] = None,
+        batched: bool = True,
         **kwargs,
     ) -> pd.DataFrame:
-        """Flatten column of dictionaries by extracting records from each entry."""
-        if not record_paths:
-            record_paths = set()
-            for idx, entry in self._s.iteritems():
-                record_paths.update(entry.keys() if not pd.isna(entry) else {})
+        """Flatten column of dictionaries by extracting records from each entry.
 
-        elif isinstance(record_paths, str):
-            record_paths = {record_paths: record_paths}
+        The resulting pd.DataFrame is aligned to the index of the series.
 
-        elif isinstance(record_paths, (list, set, tuple)):
-            record_paths = {key: key for key in record_paths}
+        :param batched: retrieve all the records from an entry in a single traversal
+            sharing common prefixes of the record paths, otherwise each record is retrieved separately
+        """
+        if not record_paths:
+            record_paths = {}
+            for entry in self._s.values:
+                record_paths.update({key: key for key in entry.keys()} if not pd.isna(entry) else {})
 
-        elif not isinstance(record_paths, typing.Mapping):
-            raise TypeError("`record_paths` expected to be of type Union[list, dict], " f"got: {type(record_paths)}")
+        record_paths, default = _prepare_record_paths(record_paths, columns=columns, default=default)
 
-        if default is None or isinstance(default, str):
-            default = {key: default for key in record_paths}
+        records = {col: [None] * len(self._s) for col in record_paths.values()}
 
-        elif not isinstance(default, dict):
-            raise TypeError("`default` expected to be of type Union[str, dict], " f"got: {type(default)}")
+        if batched:
+            trie = CompiledPathTrie(record_paths)
+            defaults = [default[key] for key in record_paths]
+            cols = list(record_paths.values())
 
-        if columns:
-            if len(record_paths) != len(columns):
-                raise ValueError(
-                    "Length of `columns` does not match length of `record_paths`: {} != {}".format(
-                        len(columns), len(record_paths)
-                    )
-                )
-            record_paths = {key: col_name for key, col_name in zip(record_paths, columns)}
-
-        records = {col: [None] * len(self._s) for col in record_paths.values()}
+            for idx, entry in enumerate(self._s.values):
+                for col, value in zip(cols, trie.get(entry, defaults)):
+                    records[col][idx] = value
+        else:
+            for idx, entry in enumerate(self._s.values):
+                for key, col in record_paths.items():
+                    records[col][idx] = rget(entry, key, default=default[key])
 
-        for idx, entry in self._s.iteritems():
-            for key, col in record_paths.items():
-                records[col][idx] = rget(entry, key, default=default[key])
+        kwargs.setdefault("index", self._s.index)
 
         return pd.DataFrame(records, **kwargs)
 
@@ -347,13 +447,67 @@ class _Underscore(object):
         """
         return pd.DataFrame.from_records(self._s.tolist(), **kwargs)
 
-    def vstack(self, drop_index=True, inplace=False) -> pd.Series:
-        """Stack column containing list of records vertically."""
-        df = pd.DataFrame.from_records(self._s.tolist())
-        stacked: pd.Series = df.stack().reset_index(drop=drop_index)
+    def vstack(self, drop_index=True, inplace=False, *, engine: str = "explode", keep_index: bool = False) -> pd.Series:
+        """Stack column containing list of records vertically.
+
+        :param engine: "explode" to build the result from flat values and offsets of the lists,
+            which requires memory linear in the total number of records, or "records" to stack
+            a DataFrame created from the lists, which requires memory of rows x max list length
+        :param keep_index: index the result by the parent index label and the position of the record in the list
+
+        Lists, tuples and numpy arrays (i.e. as loaded from Arrow snapshots) are stacked the same way:
+
+        >>> pd.Series([np.array([1, 2]), (3,), [4]])._.vstack().tolist()
+        [1, 2, 3, 4]
+        """
+        if engine == "explode":
+            stacked: pd.Series = self._explode(keep_index=keep_index)
+
+        elif engine == "records":
+            df = pd.DataFrame.from_records(self._s.tolist())
+            stacked: pd.Series = df.stack()
+
+            if keep_index:
+                parent_index = self._s.index.take(stacked.index.get_level_values(0))
+                stacked.index = pd.MultiIndex.from_arrays(
+                    [parent_index, stacked.index.get_level_values(1)], names=[self._s.index.name, None]
+                )
+
+        else:
+            raise ValueError(f"Unknown engine: {engine!r}, expected one of ['explode', 'records']")
+
+        if not keep_index:
+            stacked = stacked.reset_index(drop=drop_index)
 
         if inplace:
             self._s = stacked
             return
 
         return stacked
+
+    def _explode(self, keep_index: bool = False) -> pd.Series:
+        """Stack lists into a series indexed by the position of the parent row and of the record in the list."""
+        entries = self._s.values
+        lengths = np.fromiter(
+            (len(entry) if isinstance(entry, (list, set, tuple, np.ndarray)) else 0 for entry in entries),
+            dtype=np.int64,
+            count=len(entries),
+        )
+
+        offsets = np.cumsum(lengths) - lengths
+        parent_positions = np.repeat(np.arange(len(entries)), lengths)
+        positions = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+
+        values = [record for entry, length in zip(entries, lengths) if length for record in entry]
+
+        if keep_index:
+            index = pd.MultiIndex.from_arrays(
+                [self._s.index.take(parent_positions), positions], names=[self._s.index.name, None]
+            )
+        else:
+            index = pd.MultiIndex.from_arrays([parent_positions, positions])
+
+        stacked = pd.Series(values, index=index, dtype=object if not values else None)
+
+        # missing records are dropped the same way `stack` does
+        return stacked[stacked.notna()]
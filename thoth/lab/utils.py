@@ -18,6 +18,8 @@
 """Various utilities for notebooks."""
 
 import functools
+import hashlib
+import json
 import re
 import typing
 
@@ -25,6 +27,7 @@ from pkgutil import walk_packages
 from urllib.parse import urlparse
 
 from collections import namedtuple
+from collections import OrderedDict
 
 import importlib
 import requests
@@ -258,6 +261,52 @@ def get(obj, attr, *, default: typing.Any = DEFAULT):
         raise exc
 
 
+def _compile_projection(paths: typing.Iterable[str]) -> dict:
+    """Compile dotted paths into a tree of keys, `None` marks a subtree which is kept whole."""
+    tree = {}
+    for path in paths:
+        *parents, leaf = path.split(".")
+
+        node = tree
+        for key in parents:
+            node = node.setdefault(key, {})
+            if node is None:  # the whole subtree is kept already
+                break
+        else:
+            node[leaf] = None
+
+    return tree
+
+
+def _project(obj: typing.Any, tree: dict) -> typing.Any:
+    if isinstance(obj, (list, set)):
+        return [_project(item, tree) for item in obj]
+
+    if not isinstance(obj, dict):
+        return obj
+
+    projection = {}
+    for key, subtree in tree.items():
+        if key not in obj:
+            continue
+
+        projection[key] = obj[key] if subtree is None else _project(obj[key], subtree)
+
+    return projection
+
+
+def rproject(obj: typing.Any, paths: typing.Iterable[str]) -> typing.Any:
+    """Project nested dictionaries on the given attributes declared by dot notation accessors.
+
+    The structure of the object is preserved, lists are projected element-wise as in `rget`
+    and keys which are not present in the object are skipped.
+
+    >>> rproject({"a": {"b": 1, "c": 2}, "d": 3}, ["a.b"])
+    {'a': {'b': 1}}
+    """
+    return _project(obj, _compile_projection(paths))
+
+
 # syntactic sugar to _rhas and _rget which is meant for users
 
 rhasattr = functools.partial(_rhas, hasattr, getattr)
@@ -265,22 +314,234 @@ rhasattr.__doc__ = _rhas.__doc__
 rgetattr = functools.partial(_rget, getattr)
 rgetattr.__doc__ = _rget.__doc__
 
-rhas = functools.partial(_rhas, has, get)
-rhasattr.__doc__ = _rhas.__doc__
-rget = functools.partial(_rget, get)
-rgetattr.__doc__ = _rget.__doc__
+
+_DICT_ATTRIBUTES = frozenset(dir(dict))
+
+
+def _get_item(obj: typing.Any, attr: str) -> typing.Any:
+    """Universal `get` with a fast path for plain dictionaries."""
+    if type(obj) is dict:
+        # plain dictionaries do not have any attributes apart from those of the dict type
+        return getattr(obj, attr) if attr in _DICT_ATTRIBUTES else obj.get(attr)
+
+    return get(obj, attr)
+
+
+def _has_item(obj: typing.Any, attr: str) -> bool:
+    """Universal `has` with a fast path for plain dictionaries."""
+    if type(obj) is dict:
+        return attr in _DICT_ATTRIBUTES or attr in obj
+
+    return has(obj, attr)
+
+
+class CompiledPath(object):
+    """Nested attribute accessor declared by dot notation, pre-split to be applied repeatedly.
+
+    The semantics are the same as of `rget` and `rhas`, use `compile_path` to obtain cached instances.
+    """
+
+    __slots__ = ("path", "_get_attrs", "_has_attrs")
+
+    def __init__(self, path: str):
+        """Split the path into attributes."""
+        self.path = path
+
+        # `rhas` checks every attribute, `rget` ignores trailing empty attribute
+        attrs = tuple(path.split("."))
+
+        self._has_attrs = attrs
+        self._get_attrs = attrs[:-1] if len(attrs) > 1 and not attrs[-1] else attrs
+
+    def __repr__(self) -> str:
+        """Represent the compiled path."""
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    def get(self, obj: typing.Any, default: typing.Any = DEFAULT) -> typing.Any:
+        """Retrieve nested attribute of an object, see `rget`."""
+        return self._get(obj, 0, default)
+
+    def has(self, obj: typing.Any) -> bool:
+        """Check nested attribute of an object, see `rhas`."""
+        return self._has(obj, 0)
+
+    def _get(self, obj: typing.Any, start: int, default: typing.Any) -> typing.Any:
+        attrs = self._get_attrs
+
+        for idx in range(start, len(attrs)):
+            if isinstance(obj, (list, set)):
+                if len(obj) <= 0:
+                    return None
+
+                return [self._get(item, idx, default) for item in obj]
+
+            try:
+                obj = _get_item(obj, attrs[idx])
+            except (AttributeError, KeyError):
+                if default is not DEFAULT:
+                    return default
+
+                raise
+
+        return obj
+
+    def _has(self, obj: typing.Any, start: int) -> bool:
+        attrs = self._has_attrs
+
+        for idx in range(start, len(attrs)):
+            if isinstance(obj, list):
+                if not obj:  # empty list
+                    return False
+
+                return any(self._has(item, idx) for item in obj)
+
+            if idx == len(attrs) - 1:
+                break
+
+            obj = _get_item(obj, attrs[idx])
+
+        return _has_item(obj, attrs[-1])
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_path(path: str) -> CompiledPath:
+    """Compile nested attribute accessor declared by dot notation, compiled paths are cached by path."""
+    return CompiledPath(path)
+
+
+class _PathTrieNode(object):
+    __slots__ = ("children", "leaves", "paths")
+
+    def __init__(self):
+        self.children: typing.Dict[str, "_PathTrieNode"] = {}
+        self.leaves: typing.List[int] = []  # paths ending in this node
+        self.paths: typing.List[int] = []  # paths passing through the children of this node
+
+
+class CompiledPathTrie(object):
+    """Prefix trie of nested attribute accessors to retrieve multiple paths in a single traversal.
+
+    The semantics are the same as of `rget` applied for each of the paths, shared prefixes are traversed once.
+    """
+
+    def __init__(self, paths: typing.Iterable[str]):
+        """Compile the paths into a prefix trie."""
+        self.paths = list(paths)
+        self._root = _PathTrieNode()
+
+        for idx, path in enumerate(self.paths):
+            node = self._root
+            for attr in compile_path(path)._get_attrs:
+                node.paths.append(idx)
+                node = node.children.setdefault(attr, _PathTrieNode())
+
+            node.leaves.append(idx)
+
+    def get(self, obj: typing.Any, defaults: typing.List[typing.Any] = None) -> typing.List[typing.Any]:
+        """Retrieve all the paths from the object.
+
+        :param obj: Any, object to retrieve the paths from
+        :param defaults: default for each of the paths, similar to `rget` default
+        :return: list of retrieved attributes in the order of the paths
+        """
+        defaults = defaults if defaults is not None else [DEFAULT] * len(self.paths)
+        values = [None] * len(self.paths)
+        self._get(self._root, obj, defaults, values)
+
+        return values
+
+    def _get(self, node: _PathTrieNode, obj: typing.Any, defaults: list, values: list):
+        if isinstance(obj, (list, set)):
+            if len(obj) <= 0:
+                for idx in node.paths:
+                    values[idx] = None
+
+                return
+
+            item_values = []
+            for item in obj:
+                item_values.append([None] * len(values))
+                self._get(node, item, defaults, item_values[-1])
+
+            for idx in node.paths:
+                values[idx] = [v[idx] for v in item_values]
+
+            return
+
+        for attr, child in node.children.items():
+            try:
+                result = _get_item(obj, attr)
+            except (AttributeError, KeyError):
+                for idx in (*child.leaves, *child.paths):
+                    if defaults[idx] is DEFAULT:
+                        raise
+
+                    values[idx] = defaults[idx]
+
+                continue
+
+            for idx in child.leaves:
+                values[idx] = result
+
+            if child.children:
+                self._get(child, result, defaults, values)
+
+
+def rhas(obj: typing.Any, attr: str) -> bool:
+    """Recursively check nested attributes or keys of an object.
+
+    :param obj: Any, object to check
+    :param attr: str, attribute to find declared by dot notation accessor
+    :return: bool, whether the object has the given attribute
+    """
+    return compile_path(attr).has(obj)
+
+
+def rget(obj: typing.Any, attr: str, default: typing.Any = DEFAULT) -> typing.Any:
+    """Recursively retrieve nested attributes or keys of an object.
+
+    :param obj: Any, object to check
+    :param attr: str, attribute to find declared by dot notation accessor
+    :param default: default attribute, similar to getattr's default
+    :return: Any, retrieved attribute
+    """
+    return compile_path(attr).get(obj, default=default)
+
+
+# LRU cache of resolved queries keyed by the query and the columns and index names of the context
+_RESOLVED_QUERIES: typing.Dict[tuple, str] = OrderedDict()
+_RESOLVED_QUERIES_MAXSIZE = 256
+
+
+def clear_query_cache():
+    """Clear cache of the queries resolved by `resolve_query`."""
+    _RESOLVED_QUERIES.clear()
 
 
 def resolve_query(
     query: str, context: pd.DataFrame = None, resolvers: tuple = None, engine: str = None, parser: str = "pandas"
 ):
-    """Resolve query in the given context."""
-    from pandas.core.computation.expr import Expr
-    from pandas.core.computation.eval import _ensure_scope
+    """Resolve query in the given context.
 
+    Queries resolved in context of a DataFrame are cached by the query string and the set of columns
+    and index names, repeated queries on DataFrames of the same shape skip the operand resolution.
+    """
     if not query:
         return context
 
+    cache_key = None
+    if isinstance(context, pd.DataFrame) and not resolvers:
+        cache_key = (query, frozenset(context.columns), tuple(context.index.names), engine, parser)
+
+        resolved_query = _RESOLVED_QUERIES.get(cache_key)
+        if resolved_query is not None:
+            _RESOLVED_QUERIES.move_to_end(cache_key)
+
+            return context.query(resolved_query)
+
+    from pandas.core.computation.expr import Expr
+    from pandas.core.computation.eval import _ensure_scope
+
     q = query
     q = re.sub(r"\[\(", "", q)
     q = re.sub(r"\b(\d)+\b", "", q)
@@ -343,6 +604,11 @@ def resolve_query(
         except KeyError:
             pass
 
+    if cache_key is not None:
+        _RESOLVED_QUERIES[cache_key] = query
+        if len(_RESOLVED_QUERIES) > _RESOLVED_QUERIES_MAXSIZE:
+            _RESOLVED_QUERIES.popitem(last=False)
+
     return context.query(query)
 
 
@@ -422,3 +688,96 @@ def group_index(
     group_index = get_index_group(df, names=names, label=label)
 
     return df.set_index(group_index, inplace=inplace)
+
+
+_NESTED_TYPES = (list, tuple, dict, set, frozenset, np.ndarray)
+
+
+def _canonical_default(obj: typing.Any) -> typing.Any:
+    """Convert objects not serializable by `json` to a canonical serializable form."""
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+
+    return repr(obj)
+
+
+def hash_nested_value(value: typing.Any) -> int:
+    """Compute stable 64-bit digest of the (nested) value from its canonical JSON representation."""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=_canonical_default)
+
+    return int.from_bytes(hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class NestedValueHasher(object):
+    """Map nested values (lists, dicts, ...) to stable 64-bit digests.
+
+    Values are serialized to canonical JSON (sorted keys, sets sorted) and hashed with blake2b,
+    so equal values always map to the same digest regardless of key order or process.
+    Original values are kept in a side table of the hasher and can be restored from their digests,
+    the table can be released by `clear`.
+    """
+
+    def __init__(self):
+        """Initialize hasher with an empty table of original values."""
+        self._originals: typing.Dict[int, typing.Any] = {}
+
+    def __contains__(self, digest: typing.Any) -> bool:
+        """Check whether the digest is known to the hasher."""
+        try:
+            return digest in self._originals
+        except TypeError:
+            return False
+
+    @staticmethod
+    def is_nested(column: pd.Series) -> bool:
+        """Check whether the column contains nested values."""
+        if column.dtype != object:
+            return False
+
+        return any(isinstance(value, _NESTED_TYPES) for value in column.values)
+
+    def clear(self):
+        """Remove all recorded original values."""
+        self._originals.clear()
+
+    def digest(self, value: typing.Any) -> int:
+        """Compute digest of the value and record the original value."""
+        digest = hash_nested_value(value)
+        self._originals.setdefault(digest, value)
+
+        return digest
+
+    def hash_series(self, column: pd.Series) -> pd.Series:
+        """Hash values of the column into digests, missing values are kept missing.
+
+        >>> hasher = NestedValueHasher()
+        >>> int(hasher.hash_series(pd.Series([{"a": [1]}, None]))[0]) == hasher.digest({"a": [1]})
+        True
+        """
+        mask = np.array(
+            [not isinstance(value, _NESTED_TYPES) and pd.isna(value) for value in column.values], dtype=bool
+        )
+        # digests are built as uint64 directly, python ints would be converted through float64 and lose precision
+        digests = np.array(
+            [0 if is_missing else self.digest(value) for value, is_missing in zip(column.values, mask)], dtype=np.uint64
+        )
+
+        return pd.Series(pd.arrays.IntegerArray(digests, mask), index=column.index, name=column.name)
+
+    def restore(self, digest: typing.Any) -> typing.Any:
+        """Restore original value of the digest, values which are not known digests are returned unchanged."""
+        if digest in self:
+            return self._originals[digest]
+
+        return digest
+
+    def restore_series(self, column: pd.Series) -> pd.Series:
+        """Restore original values of the column of digests."""
+        return pd.Series([self.restore(digest) for digest in column.values], index=column.index, name=column.name)
+
+
+# default hasher of `_.groupby` and `inspection.show_categories`
+nested_value_hasher = NestedValueHasher()